@@ -1,36 +1,90 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 from .models import (
     Ingredient, Recipe, RecipeIngredient,
     UserPreference, MealPlan, MealPlanRecipe
 )
 
+class EstimatedCountPaginator(Paginator):
+    """Use PostgreSQL's row estimate instead of COUNT(*) for unfiltered large tables."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            # reltuples is -1 (or stale and small) until the table is analyzed
+            if row and row[0] >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skips the second, unfiltered COUNT(*) shown next to filtered results
+    show_full_result_count = False
+
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     list_display = ('name', 'cost_per_unit', 'unit', 'category')
-    search_fields = ('name', 'category')
+    search_fields = ('^name',)
     list_filter = ('category',)
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient', 'recipe')
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'prep_time', 'cook_time', 'servings')
-    search_fields = ('name', 'description')
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ('name', 'prep_time', 'cook_time', 'servings', 'is_generated')
+    list_filter = ('is_generated',)
+    # Name prefix search everywhere; PostgreSQL adds full-text search below
+    search_fields = ('^name',)
     inlines = [RecipeIngredientInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or connections[queryset.db].vendor != 'postgresql':
+            return super().get_search_results(request, queryset, search_term)
+        # Same expression as the api_recipe_search GIN index (migration 0009)
+        return queryset.alias(
+            search=SearchVector('name', 'description', config='english')
+        ).filter(
+            Q(search=SearchQuery(search_term, config='english', search_type='websearch'))
+            | Q(name__istartswith=search_term)
+        ), False
+
 @admin.register(UserPreference)
 class UserPreferenceAdmin(admin.ModelAdmin):
     list_display = ('user', 'weekly_budget')
-    search_fields = ('user__username',)
+    list_select_related = ('user',)
+    search_fields = ('^user__username',)
 
 class MealPlanRecipeInline(admin.TabularInline):
     model = MealPlanRecipe
     extra = 1
+    autocomplete_fields = ('recipe',)
+
+    def get_queryset(self, request):
+        # Each row's label (__str__) names the recipe, plan and plan owner
+        return super().get_queryset(request).select_related('recipe', 'meal_plan__user')
 
 @admin.register(MealPlan)
-class MealPlanAdmin(admin.ModelAdmin):
+class MealPlanAdmin(LargeTableAdmin):
     list_display = ('user', 'start_date', 'end_date', 'total_cost')
-    search_fields = ('user__username',)
+    list_select_related = ('user',)
+    search_fields = ('^user__username',)
     inlines = [MealPlanRecipeInline]
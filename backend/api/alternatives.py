@@ -0,0 +1,142 @@
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from django.db import transaction
+from .costs import ZERO, recipe_costs
+from .models import Recipe, RecipeAlternative, RecipeIngredient
+
+ALTERNATIVES_PER_RECIPE = 10
+# Candidates must cost within this fraction of the original recipe (or MIN_COST_BAND)
+COST_TOLERANCE = Decimal('0.25')
+MIN_COST_BAND = Decimal('1.00')
+# Upper bound on candidates scored per recipe, nearest in cost first
+MAX_CANDIDATES = 500
+
+# Same rules as the dietary_restrictions filter on the recipe list
+DIET_EXCLUDED_CATEGORIES = {
+    'vegetarian': {'meat', 'fish'},
+    'vegan': {'meat', 'fish', 'dairy', 'eggs'},
+    'dairy_free': {'dairy'},
+}
+GLUTEN_MARKERS = ('wheat', 'gluten')
+
+
+class RecipeFeatures:
+    __slots__ = ('recipe_id', 'cost', 'ingredients', 'diets')
+
+    def __init__(self, recipe_id, cost):
+        self.recipe_id = recipe_id
+        self.cost = cost
+        self.ingredients = set()
+        self.diets = set()
+
+
+def load_features(batch_size=5000):
+    """Load cost, ingredient set and satisfied diets for every recipe."""
+    costs = recipe_costs()
+    features = {
+        recipe_id: RecipeFeatures(recipe_id, costs.get(recipe_id, ZERO))
+        for recipe_id in Recipe.objects.values_list('id', flat=True).iterator(chunk_size=batch_size)
+    }
+
+    categories = {}
+    names = {}
+    rows = RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__category', 'ingredient__name'
+    ).iterator(chunk_size=batch_size)
+    for recipe_id, ingredient_id, category, name in rows:
+        features[recipe_id].ingredients.add(ingredient_id)
+        categories.setdefault(recipe_id, set()).add(category)
+        names.setdefault(recipe_id, []).append(name.lower())
+
+    for recipe_id, feature in features.items():
+        recipe_categories = categories.get(recipe_id, set())
+        for diet, excluded in DIET_EXCLUDED_CATEGORIES.items():
+            if not recipe_categories & excluded:
+                feature.diets.add(diet)
+        if not any(marker in name for name in names.get(recipe_id, []) for marker in GLUTEN_MARKERS):
+            feature.diets.add('gluten_free')
+    return features
+
+
+def _overlap(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _candidates_for(target, by_cost, costs, limit):
+    band = max(target.cost * COST_TOLERANCE, MIN_COST_BAND)
+    low = bisect_left(costs, target.cost - band)
+    high = bisect_right(costs, target.cost + band)
+    window = by_cost[low:high]
+    if len(window) > MAX_CANDIDATES:
+        window = sorted(window, key=lambda f: abs(f.cost - target.cost))[:MAX_CANDIDATES]
+
+    scored = []
+    for candidate in window:
+        if candidate.recipe_id == target.recipe_id:
+            continue
+        # A swap must satisfy every diet the original recipe satisfied
+        if not target.diets <= candidate.diets:
+            continue
+        closeness = 1 - float(abs(candidate.cost - target.cost) / band)
+        score = 0.7 * _overlap(target.ingredients, candidate.ingredients) + 0.3 * closeness
+        scored.append((score, candidate))
+    scored.sort(key=lambda pair: (-pair[0], pair[1].recipe_id))
+    return scored[:limit]
+
+
+def refresh_alternatives(recipe_ids=None, limit=ALTERNATIVES_PER_RECIPE, batch_size=1000):
+    """Recompute the RecipeAlternative rows for `recipe_ids` (default: all).
+
+    Returns the number of recipes refreshed.
+    """
+    features = load_features()
+    by_cost = sorted(features.values(), key=lambda f: f.cost)
+    costs = [f.cost for f in by_cost]
+
+    targets = list(features) if recipe_ids is None else [rid for rid in recipe_ids if rid in features]
+    for start in range(0, len(targets), batch_size):
+        batch = targets[start:start + batch_size]
+        rows = []
+        for recipe_id in batch:
+            target = features[recipe_id]
+            for rank, (score, candidate) in enumerate(_candidates_for(target, by_cost, costs, limit)):
+                rows.append(RecipeAlternative(
+                    recipe_id=recipe_id,
+                    alternative_id=candidate.recipe_id,
+                    rank=rank,
+                    score=score,
+                    cost_delta=candidate.cost - target.cost
+                ))
+        with transaction.atomic():
+            RecipeAlternative.objects.filter(recipe_id__in=batch).delete()
+            RecipeAlternative.objects.bulk_create(rows)
+    return len(targets)
+
+
+def ranked_alternatives(recipe_id, plan_ingredients=None, exclude=(), limit=5):
+    """Return [(alternative_id, score, cost_delta)] from the precomputed table.
+
+    When `plan_ingredients` is given, candidates sharing more ingredients
+    with the rest of the plan are ranked higher.
+    """
+    candidates = list(
+        RecipeAlternative.objects.filter(recipe_id=recipe_id)
+        .exclude(alternative_id__in=exclude)
+        .order_by('rank')
+        .values_list('alternative_id', 'score', 'cost_delta')
+    )
+    if plan_ingredients:
+        ingredients = {}
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=[c[0] for c in candidates]
+        ).values_list('recipe_id', 'ingredient_id')
+        for candidate_id, ingredient_id in rows:
+            ingredients.setdefault(candidate_id, set()).add(ingredient_id)
+        candidates = [
+            (candidate_id, score + 0.5 * _overlap(ingredients.get(candidate_id, set()), plan_ingredients), delta)
+            for candidate_id, score, delta in candidates
+        ]
+        candidates.sort(key=lambda c: -c[1])
+    return candidates[:limit]
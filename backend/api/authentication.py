@@ -0,0 +1,91 @@
+import copy
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+CACHE_PREFIX = 'api:auth:token:'
+LOCAL_CACHE_MAX_ENTRIES = 10000
+
+_local_cache = {}
+_local_lock = threading.Lock()
+
+
+def _cache_key(key):
+    # Never use the raw token as a cache key
+    return CACHE_PREFIX + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _local_get(key):
+    entry = _local_cache.get(key)
+    if entry is None:
+        return None
+    expires, value = entry
+    if expires < time.monotonic():
+        with _local_lock:
+            _local_cache.pop(key, None)
+        return None
+    return value
+
+
+def _local_set(key, value):
+    with _local_lock:
+        if len(_local_cache) >= LOCAL_CACHE_MAX_ENTRIES:
+            _local_cache.clear()
+        _local_cache[key] = (time.monotonic() + settings.API_TOKEN_LOCAL_CACHE_TTL, value)
+
+
+def shared_cache_enabled():
+    """Whether the default cache is one every worker sees, not a per-process one."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def invalidate_token(key):
+    """Drop a token from this worker's caches and from the shared cache.
+
+    Other workers keep their in-process entry for up to
+    API_TOKEN_LOCAL_CACHE_TTL seconds; the shared layer is only used when
+    a shared cache (REDIS_URL) is configured, so nothing lives longer.
+    """
+    with _local_lock:
+        _local_cache.pop(key, None)
+    cache.delete(_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that caches token lookups.
+
+    Tokens are looked up in a short-lived in-process cache, then in the
+    shared Django cache if one is configured, and only then in the
+    database. The user is loaded without its password hash, so the hash
+    never reaches either cache, and each request gets its own copy.
+    """
+
+    def load_token(self, key):
+        try:
+            return self.get_model().objects.select_related('user').defer('user__password').get(key=key)
+        except self.get_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+    def authenticate_credentials(self, key):
+        cached = _local_get(key)
+        if cached is None:
+            shared = shared_cache_enabled()
+            cached = cache.get(_cache_key(key)) if shared else None
+            if cached is None:
+                token = self.load_token(key)
+                cached = (token.user, token)
+                if shared:
+                    cache.set(_cache_key(key), cached, settings.API_TOKEN_CACHE_TTL)
+            _local_set(key, cached)
+
+        # The cached instances are shared by every thread of this worker
+        user, token = copy.deepcopy(cached)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return (user, token)
@@ -0,0 +1,114 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from ..costs import recompute_plan_costs
+from ..models import (
+    Ingredient, Recipe, RecipeIngredient,
+    UserPreference, MealPlan, MealPlanRecipe, UserPantry
+)
+from ..prompts import meal_types
+
+WORDS = [
+    'garlic', 'lemon', 'tomato', 'basil', 'chili', 'ginger', 'honey', 'smoked',
+    'roasted', 'crispy', 'green', 'sweet', 'spicy', 'herb', 'golden', 'wild',
+]
+DISHES = ['salad', 'stew', 'curry', 'pasta', 'bowl', 'soup', 'tacos', 'bake', 'stir fry', 'risotto']
+
+
+def generate_dataset(users=20, ingredients=300, recipes=500, pantry_rows=30, plans=2,
+                     ingredients_per_recipe=8, seed=1):
+    """Bulk-create a synthetic data set for the benchmarks.
+
+    `pantry_rows` and `plans` are per user; plans are 7 days of 3 meals.
+    The same arguments and seed always produce the same data.
+    """
+    rng = random.Random(seed)
+    categories = [code for code, _ in Ingredient.CATEGORY_CHOICES]
+    units = [code for code, _ in Ingredient.UNIT_CHOICES]
+
+    Ingredient.objects.bulk_create([
+        Ingredient(
+            name=f'{rng.choice(WORDS)} ingredient {i}',
+            category=rng.choice(categories),
+            unit=rng.choice(units),
+            cost_per_unit=Decimal(rng.randint(10, 900)) / 100,
+        )
+        for i in range(ingredients)
+    ])
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+
+    Recipe.objects.bulk_create([
+        Recipe(
+            name=f'{rng.choice(WORDS)} {rng.choice(DISHES)} {i}',
+            description='Synthetic benchmark recipe',
+            instructions='Prepare the ingredients.\nCook until done.',
+            prep_time=rng.randint(5, 45),
+            cook_time=rng.randint(0, 90),
+            servings=rng.randint(1, 6),
+        )
+        for i in range(recipes)
+    ])
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(
+            recipe_id=recipe_id,
+            ingredient_id=ingredient_id,
+            quantity=Decimal(rng.randint(1, 40)) / 4,
+            unit=rng.choice(units),
+        )
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(ingredient_ids, min(ingredients_per_recipe, len(ingredient_ids)))
+    ], batch_size=1000)
+
+    # Users only authenticate through force_authenticate, so skip password hashing
+    password = make_password(None)
+    User.objects.bulk_create([User(username=f'bench-{i}', password=password) for i in range(users)])
+    user_list = list(User.objects.filter(username__startswith='bench-').order_by('id'))
+    UserPreference.objects.bulk_create([UserPreference(user=user) for user in user_list])
+
+    today = date.today()
+    UserPantry.objects.bulk_create([
+        UserPantry(
+            user=user,
+            ingredient_id=ingredient_id,
+            quantity=Decimal(rng.randint(1, 20)),
+            expiry_date=today + timedelta(days=rng.randint(-2, 30)) if rng.random() < 0.8 else None,
+        )
+        for user in user_list
+        for ingredient_id in rng.sample(ingredient_ids, min(pantry_rows, len(ingredient_ids)))
+    ], batch_size=1000)
+
+    MealPlan.objects.bulk_create([
+        MealPlan(
+            user=user,
+            start_date=today + timedelta(days=7 * n),
+            end_date=today + timedelta(days=7 * n + 6),
+            total_cost=0,
+        )
+        for user in user_list
+        for n in range(plans)
+    ])
+    plan_ids = list(MealPlan.objects.values_list('id', flat=True))
+    MealPlanRecipe.objects.bulk_create([
+        MealPlanRecipe(meal_plan_id=plan_id, recipe_id=rng.choice(recipe_ids), day=day, meal_type=meal_type)
+        for plan_id in plan_ids
+        for day in range(1, 8)
+        for meal_type in meal_types(3)
+    ], batch_size=1000)
+    recompute_plan_costs(plan_ids)
+
+    return {
+        'users': user_list,
+        'ingredient_ids': ingredient_ids,
+        'params': {
+            'users': users,
+            'ingredients': ingredients,
+            'recipes': recipes,
+            'pantry_rows': pantry_rows,
+            'plans': plans,
+            'ingredients_per_recipe': ingredients_per_recipe,
+            'seed': seed,
+        },
+    }
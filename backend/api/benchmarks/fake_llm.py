@@ -0,0 +1,80 @@
+import itertools
+import json
+import re
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from .. import llm
+
+_WHOLE_PLAN = re.compile(r'Create a (\d+)-day meal plan with \d+ meals per day \(([a-z,]+)\)')
+_DAY_PLAN = re.compile(r'Create day (\d+) of a \d+-day meal plan: \d+ meals \(([a-z,]+)\)')
+_ONLY = re.compile(r'Only return these meals: (.*)\.')
+_RECIPES = re.compile(r'(?:Suggest|Create) (\d+) (?:recipes|variations)')
+_PALETTE = re.compile(r'List (\d+) versatile ingredients')
+
+
+class FakeLLM:
+    """Stand-in for `llm.backend` that answers every prompt with valid compact JSON.
+
+    `latency` seconds are slept per call to mimic waiting on the model.
+    """
+
+    def __init__(self, ingredient_names, latency=0.0):
+        self.ingredient_names = list(ingredient_names) or ['rice']
+        self.latency = latency
+        self.counter = itertools.count()
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        content = self.reply(kwargs['messages'][-1]['content'])
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    def recipe(self):
+        n = next(self.counter)
+        names = self.ingredient_names
+        return {
+            'n': f'Benchmark recipe {n}',
+            'd': 'Generated by the fake model',
+            'p': 10, 'c': 20, 'v': 2, '$': 6.5,
+            'i': [[names[(n * 3 + k) % len(names)], 1 + k, 'pieces'] for k in range(4)],
+            's': 'Mix and cook.',
+        }
+
+    def reply(self, prompt):
+        match = _PALETTE.search(prompt)
+        if match:
+            return json.dumps(self.ingredient_names[:int(match.group(1))])
+
+        only = _ONLY.search(prompt)
+        if only:
+            slots = [part.split()[1:] for part in only.group(1).split(', ')]
+            return json.dumps({'m': [{'d': int(day), 't': letter, 'r': self.recipe()} for day, letter in slots]})
+
+        match = _DAY_PLAN.search(prompt)
+        if match:
+            days = [int(match.group(1))]
+        else:
+            match = _WHOLE_PLAN.search(prompt)
+            days = range(1, int(match.group(1)) + 1) if match else None
+        if days is not None:
+            letters = match.group(2).split(',')
+            return json.dumps({'m': [{'d': day, 't': t, 'r': self.recipe()} for day in days for t in letters]})
+
+        match = _RECIPES.search(prompt)
+        count = int(match.group(1)) if match else 1
+        return json.dumps([self.recipe() for _ in range(count)])
+
+
+@contextmanager
+def fake_backend(fake):
+    """Route `llm.chat` through `fake` for the duration of the block."""
+    previous = llm.backend
+    llm.backend = fake
+    try:
+        yield fake
+    finally:
+        llm.backend = previous
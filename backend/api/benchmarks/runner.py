@@ -0,0 +1,264 @@
+import json
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from ..middleware import brotli, compress
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def build_scenarios(dataset):
+    """Return (name, request function, safe to run concurrently) triples.
+
+    Each request function takes (client, user, i) and returns a response.
+    Scenarios run in order, so pantry updates and deletes reuse the rows
+    each user created in `pantry_create`.
+    """
+    ingredient_ids = dataset['ingredient_ids']
+    plan_ids = {}
+    created = {}
+
+    def plan_for(user):
+        if user.id not in plan_ids:
+            plan_ids[user.id] = user.mealplan_set.values_list('id', flat=True).first()
+        return plan_ids[user.id]
+
+    def pantry_create(client, user, i):
+        response = client.post('/api/pantry/', {
+            'ingredient': ingredient_ids[i % len(ingredient_ids)], 'quantity': '2.00'
+        }, format='json')
+        if response.status_code == 201:
+            created.setdefault(user.id, []).append(response.data['id'])
+        return response
+
+    def pantry_update(client, user, i):
+        ids = created[user.id]
+        return client.patch(f'/api/pantry/{ids[i % len(ids)]}/', {'quantity': '3.00'}, format='json')
+
+    def pantry_delete(client, user, i):
+        return client.delete(f'/api/pantry/{created[user.id].pop()}/')
+
+    return [
+        ('recipes_list', lambda client, user, i: client.get('/api/recipes/'), True),
+        ('recipes_sparse', lambda client, user, i: client.get('/api/recipes/', {'fields': 'id,name'}), True),
+        ('recipes_batch', lambda client, user, i: client.get(
+            '/api/recipes/', {'ids': ','.join(str(pk) for pk in range(1, 21))}), True),
+        ('recipes_by_name', lambda client, user, i: client.get('/api/recipes/', {'name': 'curry'}), True),
+        ('recipes_by_ingredients', lambda client, user, i: client.get(
+            '/api/recipes/', {'ingredients': 'garlic,tomato'}), True),
+        ('recipes_vegetarian', lambda client, user, i: client.get(
+            '/api/recipes/', {'dietary_restrictions': 'vegetarian', 'max_prep_time': 30}), True),
+        ('recipes_by_cost', lambda client, user, i: client.get(
+            '/api/recipes/', {'min_cost': 5, 'max_cost': 40}), True),
+        ('shopping_list', lambda client, user, i: client.get(
+            f'/api/meal-plans/{plan_for(user)}/shopping_list/'), True),
+        ('expiring_soon', lambda client, user, i: client.get('/api/pantry/expiring_soon/'), True),
+        ('pantry_list', lambda client, user, i: client.get('/api/pantry/'), True),
+        ('pantry_create', pantry_create, False),
+        ('pantry_update', pantry_update, False),
+        ('pantry_delete', pantry_delete, False),
+        ('meal_plan_generate', lambda client, user, i: client.post(
+            '/api/meal-plans/generate/', {'days': 7}, format='json'), False),
+    ]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarize(latencies, queries, errors, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'queries_per_request': round(sum(queries) / count, 2) if count else 0.0,
+    }
+
+
+def _timed(request, client, user, i):
+    with CaptureQueriesContext(connection) as captured:
+        start = time.perf_counter()
+        response = request(client, user, i)
+        latency = time.perf_counter() - start
+    return latency, len(captured), response.status_code >= 400
+
+
+def run_sequential(request, users, iterations, warmup=2):
+    clients = [(client_for(user), user) for user in users]
+    for i in range(warmup):
+        client, user = clients[i % len(clients)]
+        request(client, user, i)
+
+    latencies, queries, errors = [], [], 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        client, user = clients[i % len(clients)]
+        latency, count, failed = _timed(request, client, user, warmup + i)
+        latencies.append(latency)
+        queries.append(count)
+        errors += failed
+    return summarize(latencies, queries, errors, time.perf_counter() - start)
+
+
+def run_concurrent(request, users, iterations, concurrency):
+    """Drive `request` from `concurrency` threads, each acting as a different user."""
+    def worker(n):
+        user = users[n % len(users)]
+        client = client_for(user)
+        results = []
+        try:
+            for i in range(n, iterations, concurrency):
+                results.append(_timed(request, client, user, i))
+        finally:
+            connection.close()
+        return results
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [result for batch in pool.map(worker, range(concurrency)) for result in batch]
+    elapsed = time.perf_counter() - start
+    return summarize(
+        [latency for latency, _, _ in results],
+        [count for _, count, _ in results],
+        sum(failed for _, _, failed in results),
+        elapsed
+    )
+
+
+def run_suite(dataset, iterations=50, concurrency=4, only=None, log=print):
+    """Run every scenario sequentially and, where safe, concurrently."""
+    users = dataset['users']
+    results = {}
+    for name, request, concurrent_safe in build_scenarios(dataset):
+        if only and name not in only:
+            continue
+        results[name] = run_sequential(request, users, iterations)
+        log(format_row(name, results[name]))
+        if concurrent_safe and concurrency > 1:
+            key = f'{name}@{concurrency}'
+            results[key] = run_concurrent(request, users, iterations, concurrency)
+            log(format_row(key, results[key]))
+    return results
+
+
+def measure_payloads(dataset, repeat=20):
+    """Size and encode time of a full meal plan in each response shape and encoding."""
+    user = dataset['users'][0]
+    plan_id = user.mealplan_set.values_list('id', flat=True).first()
+    client = client_for(user)
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+    results = {}
+    for shape, params in (('nested', {}), ('normalized', {'shape': 'normalized'})):
+        response = client.get(f'/api/meal-plans/{plan_id}/', params)
+        body = response.content
+        start = time.perf_counter()
+        for _ in range(repeat):
+            JSONRenderer().render(response.data)
+        row = {'bytes': len(body), 'render_ms': round((time.perf_counter() - start) / repeat * 1000, 3)}
+        for encoding in encodings:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                compressed = compress(body, encoding)
+            row[f'{encoding}_bytes'] = len(compressed)
+            row[f'{encoding}_ms'] = round((time.perf_counter() - start) / repeat * 1000, 3)
+        # What the middleware actually sends a client accepting everything
+        served = client.get(f'/api/meal-plans/{plan_id}/', params, HTTP_ACCEPT_ENCODING='br, gzip')
+        row['served_encoding'] = served.get('Content-Encoding', 'identity')
+        row['served_bytes'] = len(served.content)
+        results[f'meal_plan_{shape}'] = row
+    return results
+
+
+def format_payload_row(name, row):
+    encoded = '  '.join(
+        f'{encoding} {row[f"{encoding}_bytes"]:8d} B in {row[f"{encoding}_ms"]:6.2f} ms'
+        for encoding in ('gzip', 'br') if f'{encoding}_bytes' in row
+    )
+    return f'{name:>28}: {row["bytes"]:8d} B (render {row["render_ms"]:6.2f} ms)  {encoded}'
+
+
+def format_row(name, result):
+    return (
+        f'{name:>28}: p50 {result["p50_ms"]:8.2f} ms  p95 {result["p95_ms"]:8.2f} ms  '
+        f'p99 {result["p99_ms"]:8.2f} ms  {result["throughput_rps"]:8.1f} req/s  '
+        f'{result["queries_per_request"]:6.1f} queries  {result["errors"]} errors'
+    )
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_results(results, params, directory, payloads=None):
+    """Write a results file named after the time and commit; returns its path."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    commit = current_commit()
+    now = datetime.now()
+    path = directory / f'{now:%Y%m%d-%H%M%S}-{commit}.json'
+    path.write_text(json.dumps({
+        'commit': commit,
+        'timestamp': now.isoformat(timespec='seconds'),
+        'params': params,
+        'scenarios': results,
+        'payloads': payloads or {},
+    }, indent=2))
+    return path
+
+
+def latest_results(directory, exclude=None):
+    paths = sorted(p for p in Path(directory).glob('*.json') if p != exclude)
+    return paths[-1] if paths else None
+
+
+def compare(baseline, results):
+    """Yield one line per scenario with the p50/p95 and query changes against `baseline`."""
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            yield f'{name:>28}: new'
+            continue
+        deltas = []
+        for key in ('p50_ms', 'p95_ms'):
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            deltas.append(f'{key[:3]} {before[key]:.2f} -> {result[key]:.2f} ms ({change:+.1f}%)')
+        deltas.append(f'queries {before["queries_per_request"]} -> {result["queries_per_request"]}')
+        yield f'{name:>28}: ' + '  '.join(deltas)
+
+
+def compare_payloads(baseline, payloads):
+    for name, row in payloads.items():
+        before = baseline.get(name)
+        if before is None:
+            yield f'{name:>28}: new'
+            continue
+        yield f'{name:>28}: ' + '  '.join(
+            f'{key} {before[key]} -> {row[key]}'
+            for key in ('bytes', 'gzip_bytes', 'br_bytes') if key in row and key in before
+        )
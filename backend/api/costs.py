@@ -0,0 +1,93 @@
+from decimal import Decimal
+from django.db import models, transaction
+from django.utils import timezone
+from .models import MealPlan, MealPlanRecipe, RecipeIngredient
+from .sync import record_changes
+
+ZERO = Decimal('0.00')
+
+
+def recipe_costs(recipe_ids=None):
+    """Return {recipe_id: cost} using one aggregate query.
+
+    With `recipe_ids` of None every recipe that has ingredients is costed.
+    """
+    queryset = RecipeIngredient.objects.all()
+    costs = {}
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        queryset = queryset.filter(recipe_id__in=recipe_ids)
+        costs = {recipe_id: ZERO for recipe_id in recipe_ids}
+
+    rows = queryset.values('recipe_id').annotate(
+        cost=models.Sum(
+            models.F('quantity') * models.F('ingredient__cost_per_unit'),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2)
+        )
+    )
+    for row in rows:
+        costs[row['recipe_id']] = Decimal(row['cost'] or 0).quantize(Decimal('0.01'))
+    return costs
+
+
+def plan_costs(plan_ids):
+    """Return {meal_plan_id: cost} for the given plans using one aggregate query."""
+    plan_ids = list(plan_ids)
+    costs = {plan_id: ZERO for plan_id in plan_ids}
+    rows = MealPlanRecipe.objects.filter(meal_plan_id__in=plan_ids).values('meal_plan_id').annotate(
+        cost=models.Sum(
+            models.F('recipe__recipeingredient__quantity') *
+            models.F('recipe__recipeingredient__ingredient__cost_per_unit'),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2)
+        )
+    )
+    for row in rows:
+        costs[row['meal_plan_id']] = Decimal(row['cost'] or 0).quantize(Decimal('0.01'))
+    return costs
+
+
+def recompute_plan_costs(plan_ids, batch_size=500):
+    """Recompute MealPlan.total_cost for the given plans in batches.
+
+    Only plans whose cost actually changed are written. Returns the
+    number of plans updated.
+    """
+    plan_ids = list(plan_ids)
+    updated = 0
+    for start in range(0, len(plan_ids), batch_size):
+        batch = plan_ids[start:start + batch_size]
+        costs = plan_costs(batch)
+        now = timezone.now()
+        changed = []
+        for plan in MealPlan.objects.filter(pk__in=batch).only('id', 'user_id', 'total_cost'):
+            if plan.total_cost != costs[plan.pk]:
+                plan.total_cost = costs[plan.pk]
+                plan.updated_at = now
+                changed.append(plan)
+        if changed:
+            with transaction.atomic():
+                MealPlan.objects.bulk_update(changed, ['total_cost', 'updated_at'])
+                record_changes((plan.user_id, 'meal_plan', plan.pk, 'upsert') for plan in changed)
+        updated += len(changed)
+    return updated
+
+
+def recompute_costs_for_recipes(recipe_ids):
+    plan_ids = MealPlanRecipe.objects.filter(recipe_id__in=list(recipe_ids)).values_list(
+        'meal_plan_id', flat=True
+    ).distinct()
+    return recompute_plan_costs(plan_ids)
+
+
+def plans_using_ingredients(ingredient_ids, batch_size=500):
+    ingredient_ids = list(ingredient_ids)
+    plan_ids = set()
+    for start in range(0, len(ingredient_ids), batch_size):
+        plan_ids.update(MealPlanRecipe.objects.filter(
+            recipe__recipeingredient__ingredient_id__in=ingredient_ids[start:start + batch_size]
+        ).values_list('meal_plan_id', flat=True).distinct())
+    return plan_ids
+
+
+def recompute_costs_for_ingredients(ingredient_ids):
+    return recompute_plan_costs(sorted(plans_using_ingredients(ingredient_ids)))
@@ -0,0 +1,98 @@
+from datetime import timedelta
+from itertools import groupby
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import ChangeLog, ExpiryDigest, UserPantry
+from .serializers import UserPantrySerializer
+
+
+def expiring_queryset(queryset, window_days, today=None):
+    today = today or timezone.localdate()
+    return queryset.filter(
+        expiry_date__gte=today,
+        expiry_date__lte=today + timedelta(days=window_days)
+    )
+
+
+def scan_expiring_items(window_days=None, batch_size=1000):
+    """Rebuild every user's ExpiryDigest in one pass over the (user, expiry) index.
+
+    Digests are written and committed `batch_size` users at a time.
+    Returns the number of users with at least one expiring item.
+    """
+    if window_days is None:
+        window_days = settings.PANTRY_EXPIRY_WINDOW_DAYS
+    today = timezone.localdate()
+    now = timezone.now()
+    # Taken before scanning so changes made during the scan mark digests stale
+    cursor = ChangeLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    rows = expiring_queryset(UserPantry.objects.all(), window_days, today).select_related(
+        'ingredient'
+    ).order_by('user_id', 'expiry_date', 'id').iterator(chunk_size=batch_size)
+
+    users = 0
+    batch = []
+    for user_id, items in groupby(rows, key=lambda row: row.user_id):
+        items = list(items)
+        batch.append(ExpiryDigest(
+            user_id=user_id,
+            window_days=window_days,
+            scan_date=today,
+            items=UserPantrySerializer(items, many=True).data,
+            item_count=len(items),
+            earliest_expiry=items[0].expiry_date,
+            cursor=cursor,
+            generated_at=now
+        ))
+        users += 1
+        if len(batch) >= batch_size:
+            _write_digests(batch)
+            batch = []
+    _write_digests(batch)
+
+    # Users with nothing expiring any more keep an empty digest
+    ExpiryDigest.objects.filter(generated_at__lt=now).update(
+        window_days=window_days,
+        scan_date=today,
+        items=[],
+        item_count=0,
+        earliest_expiry=None,
+        cursor=cursor,
+        generated_at=now
+    )
+    return users
+
+
+def _write_digests(batch):
+    if not batch:
+        return
+    with transaction.atomic():
+        ExpiryDigest.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[
+                'window_days', 'scan_date', 'items', 'item_count',
+                'earliest_expiry', 'cursor', 'generated_at'
+            ]
+        )
+
+
+def cached_expiring_items(user, window_days):
+    """Return the user's precomputed expiring items, or None if unusable.
+
+    A digest is only served if it was built today for the same window and
+    no pantry change has been logged for the user since. Items are stored
+    in their full representation, so callers honouring `fields=`/`expand=`
+    must serialize from the database instead.
+    """
+    digest = ExpiryDigest.objects.filter(
+        user=user, window_days=window_days, scan_date=timezone.localdate()
+    ).first()
+    if digest is None:
+        return None
+    if ChangeLog.objects.filter(user=user, entity='pantry', id__gt=digest.cursor).exists():
+        return None
+    return digest.items
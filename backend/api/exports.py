@@ -0,0 +1,155 @@
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Sum
+from .models import ChangeLog, MealPlanRecipe, RecipeIngredient, UserPantry
+
+DEFAULT_CHUNK_SIZE = 2000
+# Streamed output is flushed in pieces of about this many characters
+BUFFER_SIZE = 64 * 1024
+
+
+def pantry_totals(user):
+    totals = {}
+    rows = UserPantry.objects.filter(user=user).values_list('ingredient_id', 'quantity')
+    for ingredient_id, quantity in rows:
+        totals[ingredient_id] = totals.get(ingredient_id, 0) + float(quantity)
+    return totals
+
+
+def shopping_lists(user, plan_ids=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield shopping list rows for all of a user's plans from one aggregate query.
+
+    Ingredients are summed over every slot of each plan and the user's
+    pantry is subtracted from each plan's list separately.
+    """
+    pantry = pantry_totals(user)
+    # One filter() call, so both conditions apply to the same slot join
+    conditions = {'recipe__mealplanrecipe__meal_plan__user': user}
+    if plan_ids is not None:
+        conditions['recipe__mealplanrecipe__meal_plan_id__in'] = plan_ids
+    rows = RecipeIngredient.objects.filter(**conditions).values(
+        'recipe__mealplanrecipe__meal_plan_id', 'ingredient_id',
+        'ingredient__name', 'ingredient__unit', 'ingredient__cost_per_unit'
+    ).annotate(needed=Sum('quantity')).order_by(
+        'recipe__mealplanrecipe__meal_plan_id', 'ingredient__name'
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        needed = float(row['needed'])
+        yield {
+            'meal_plan_id': row['recipe__mealplanrecipe__meal_plan_id'],
+            'ingredient': row['ingredient__name'],
+            'unit': row['ingredient__unit'],
+            'needed': needed,
+            'total_quantity': max(0, needed - pantry.get(row['ingredient_id'], 0)),
+            'cost_per_unit': row['ingredient__cost_per_unit'],
+        }
+
+
+def meal_plan_rows(user, chunk_size=DEFAULT_CHUNK_SIZE):
+    rows = MealPlanRecipe.objects.filter(meal_plan__user=user).order_by('meal_plan_id', 'day', 'id').values(
+        'meal_plan_id', 'meal_plan__start_date', 'meal_plan__end_date', 'meal_plan__total_cost',
+        'day', 'meal_type', 'recipe_id', 'recipe__name', 'cooked_at'
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'meal_plan_id': row['meal_plan_id'],
+            'start_date': row['meal_plan__start_date'],
+            'end_date': row['meal_plan__end_date'],
+            'total_cost': row['meal_plan__total_cost'],
+            'day': row['day'],
+            'meal_type': row['meal_type'],
+            'recipe_id': row['recipe_id'],
+            'recipe': row['recipe__name'],
+            'cooked_at': row['cooked_at'],
+        }
+
+
+def pantry_rows(user, chunk_size=DEFAULT_CHUNK_SIZE):
+    rows = UserPantry.objects.filter(user=user).order_by('id').values(
+        'id', 'ingredient__name', 'quantity', 'ingredient__unit', 'expiry_date', 'added_date', 'updated_date'
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'id': row['id'],
+            'ingredient': row['ingredient__name'],
+            'quantity': row['quantity'],
+            'unit': row['ingredient__unit'],
+            'expiry_date': row['expiry_date'],
+            'added_date': row['added_date'],
+            'updated_date': row['updated_date'],
+        }
+
+
+def pantry_history_rows(user, chunk_size=DEFAULT_CHUNK_SIZE):
+    rows = ChangeLog.objects.filter(user=user, entity='pantry').order_by('id').values_list(
+        'changed_at', 'action', 'object_id'
+    )
+    for changed_at, action, object_id in rows.iterator(chunk_size=chunk_size):
+        yield {'changed_at': changed_at, 'action': action, 'pantry_item_id': object_id}
+
+
+# Section name -> (CSV columns, row generator)
+SECTIONS = {
+    'meal_plans': (
+        ['meal_plan_id', 'start_date', 'end_date', 'total_cost', 'day', 'meal_type', 'recipe_id', 'recipe', 'cooked_at'],
+        meal_plan_rows,
+    ),
+    'pantry': (
+        ['id', 'ingredient', 'quantity', 'unit', 'expiry_date', 'added_date', 'updated_date'],
+        pantry_rows,
+    ),
+    'pantry_history': (
+        ['changed_at', 'action', 'pantry_item_id'],
+        pantry_history_rows,
+    ),
+    'shopping_lists': (
+        ['meal_plan_id', 'ingredient', 'unit', 'needed', 'total_quantity', 'cost_per_unit'],
+        shopping_lists,
+    ),
+}
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the csv writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def _buffered(pieces, size=BUFFER_SIZE):
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _csv_lines(user, section, chunk_size):
+    columns, rows = SECTIONS[section]
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows(user, chunk_size=chunk_size):
+        yield writer.writerow([row[column] for column in columns])
+
+
+def _jsonl_lines(user, sections, chunk_size):
+    encoder = DjangoJSONEncoder()
+    for section in sections:
+        for row in SECTIONS[section][1](user, chunk_size=chunk_size):
+            yield encoder.encode(dict(row, section=section)) + '\n'
+
+
+def stream_export(user, file_format, sections, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the export as text chunks, holding only one chunk of rows in memory.
+
+    CSV exports carry a single section; JSON lines tag every row with its section.
+    """
+    if file_format == 'csv':
+        return _buffered(_csv_lines(user, sections[0], chunk_size))
+    return _buffered(_jsonl_lines(user, sections, chunk_size))
@@ -0,0 +1,190 @@
+import heapq
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .alternatives import DIET_EXCLUDED_CATEGORIES, load_features
+from .models import (
+    ChangeLog, FeedEntry, Recipe, RecommendationFeed,
+    UserPantry, UserPreference
+)
+
+# Diets load_features can check; other restrictions (keto, paleo) don't filter
+CHECKED_DIETS = set(DIET_EXCLUDED_CATEGORIES) | {'gluten_free'}
+# Recipes carry no cuisine field, so cuisines are matched on name keywords
+CUISINE_KEYWORDS = {
+    'american': ('burger', 'bbq', 'mac', 'sandwich', 'pancake', 'chili'),
+    'italian': ('pasta', 'risotto', 'pizza', 'lasagna', 'pesto', 'gnocchi', 'italian'),
+    'mexican': ('taco', 'burrito', 'enchilada', 'quesadilla', 'salsa', 'fajita', 'mexican'),
+    'chinese': ('stir fry', 'fried rice', 'dumpling', 'chow mein', 'kung pao', 'chinese'),
+    'japanese': ('sushi', 'ramen', 'teriyaki', 'miso', 'udon', 'japanese'),
+    'thai': ('pad thai', 'thai', 'green curry', 'red curry', 'satay'),
+    'indian': ('curry', 'masala', 'dal', 'tikka', 'biryani', 'indian'),
+    'mediterranean': ('hummus', 'falafel', 'greek', 'tabbouleh', 'couscous', 'mediterranean'),
+    'french': ('ratatouille', 'quiche', 'gratin', 'crepe', 'french'),
+    'korean': ('bibimbap', 'kimchi', 'bulgogi', 'gochujang', 'korean'),
+}
+MEALS_PER_WEEK = 21
+
+
+class UserProfile:
+    __slots__ = ('diet', 'keywords', 'meal_budget', 'disliked', 'pantry', 'expiring')
+
+    def __init__(self, preference):
+        self.diet = preference.dietary_restrictions
+        self.keywords = CUISINE_KEYWORDS.get(preference.preferred_cuisines, ())
+        self.meal_budget = preference.weekly_budget / MEALS_PER_WEEK
+        self.disliked = set()
+        self.pantry = set()
+        self.expiring = set()
+
+
+def score_recipe(feature, name, profile):
+    """Score a recipe for a user, or None if it breaks their restrictions."""
+    if profile.diet in CHECKED_DIETS and profile.diet not in feature.diets:
+        return None
+    if feature.ingredients & profile.disliked:
+        return None
+    coverage = len(feature.ingredients & profile.pantry) / len(feature.ingredients) if feature.ingredients else 0.0
+    uses_expiring = 1.0 if feature.ingredients & profile.expiring else 0.0
+    if feature.cost <= profile.meal_budget or not profile.meal_budget:
+        budget_fit = 1.0
+    else:
+        budget_fit = max(0.0, 1 - float((feature.cost - profile.meal_budget) / profile.meal_budget))
+    cuisine = 1.0 if any(keyword in name for keyword in profile.keywords) else 0.0
+    return 0.45 * coverage + 0.15 * uses_expiring + 0.25 * budget_fit + 0.15 * cuisine
+
+
+def _profiles(user_ids):
+    profiles = {
+        pref.user_id: UserProfile(pref)
+        for pref in UserPreference.objects.filter(user_id__in=user_ids)
+    }
+    disliked = UserPreference.disliked_ingredients.through.objects.filter(
+        userpreference__user_id__in=user_ids
+    ).values_list('userpreference__user_id', 'ingredient_id')
+    for user_id, ingredient_id in disliked:
+        profiles[user_id].disliked.add(ingredient_id)
+
+    soon = timezone.localdate() + timedelta(days=settings.PANTRY_EXPIRY_WINDOW_DAYS)
+    pantry = UserPantry.objects.filter(user_id__in=user_ids, quantity__gt=0).values_list(
+        'user_id', 'ingredient_id', 'expiry_date'
+    )
+    for user_id, ingredient_id, expiry_date in pantry:
+        if user_id in profiles:
+            profiles[user_id].pantry.add(ingredient_id)
+            if expiry_date is not None and expiry_date <= soon:
+                profiles[user_id].expiring.add(ingredient_id)
+    return profiles
+
+
+def _stale_users(user_ids, feeds, full):
+    """Split users into those needing a rebuild and those only missing new recipes."""
+    if full:
+        return set(user_ids)
+    rebuild = {user_id for user_id in user_ids if user_id not in feeds or feeds[user_id].dirty}
+    tracked = [feeds[user_id] for user_id in user_ids if user_id not in rebuild]
+    if tracked:
+        changed = ChangeLog.objects.filter(
+            user_id__in=[feed.user_id for feed in tracked],
+            entity='pantry',
+            id__gt=min(feed.cursor for feed in tracked)
+        ).values('user_id').annotate(last=Max('id'))
+        rebuild.update(row['user_id'] for row in changed if row['last'] > feeds[row['user_id']].cursor)
+    return rebuild
+
+
+def refresh_feeds(user_ids=None, full=False, size=None, batch_size=500):
+    """Bring the materialized recommendation feeds up to date.
+
+    Users whose preferences or pantry changed since their last build (or
+    who have no feed yet) are rescored against the whole catalogue; the
+    rest only have recipes newer than their watermark merged in.
+    Returns (rebuilt, extended) user counts.
+    """
+    size = size or settings.RECOMMENDATION_FEED_SIZE
+    # Taken before reading anything so changes made meanwhile are picked up next run
+    cursor = ChangeLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    latest_recipe = Recipe.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    users = UserPreference.objects.order_by('user_id').values_list('user_id', flat=True)
+    if user_ids is not None:
+        users = users.filter(user_id__in=user_ids)
+    users = list(users)
+
+    features = names = None
+    rebuilt = extended = 0
+    for start in range(0, len(users), batch_size):
+        batch = users[start:start + batch_size]
+        feeds = RecommendationFeed.objects.in_bulk(batch, field_name='user_id')
+        rebuild = _stale_users(batch, feeds, full)
+        extend = {
+            user_id for user_id in batch
+            if user_id not in rebuild and feeds[user_id].recipe_watermark < latest_recipe
+        }
+        if not rebuild and not extend:
+            continue
+        if features is None:
+            features = load_features()
+            names = {
+                recipe_id: name.lower()
+                for recipe_id, name in Recipe.objects.values_list('id', 'name').iterator(chunk_size=5000)
+            }
+
+        # Cleared before reading inputs so a concurrent preference edit marks it again
+        RecommendationFeed.objects.filter(user_id__in=rebuild).update(dirty=False)
+        profiles = _profiles(rebuild | extend)
+        kept = {}
+        for user_id, score, recipe_id, cost in FeedEntry.objects.filter(user_id__in=extend).values_list(
+            'user_id', 'score', 'recipe_id', 'cost'
+        ):
+            kept.setdefault(user_id, []).append((score, recipe_id, cost))
+
+        entries = []
+        for user_id in rebuild | extend:
+            profile = profiles[user_id]
+            if user_id in rebuild:
+                candidates = features.values()
+                scored = []
+            else:
+                watermark = feeds[user_id].recipe_watermark
+                candidates = [f for f in features.values() if f.recipe_id > watermark]
+                scored = kept.get(user_id, [])
+            for feature in candidates:
+                score = score_recipe(feature, names.get(feature.recipe_id, ''), profile)
+                if score is not None:
+                    scored.append((score, feature.recipe_id, feature.cost))
+            top = heapq.nlargest(size, scored, key=lambda item: (item[0], -item[1]))
+            entries.extend(
+                FeedEntry(user_id=user_id, rank=rank, recipe_id=recipe_id, score=score, cost=cost)
+                for rank, (score, recipe_id, cost) in enumerate(top)
+            )
+
+        now = timezone.now()
+        with transaction.atomic():
+            FeedEntry.objects.filter(user_id__in=rebuild | extend).delete()
+            FeedEntry.objects.bulk_create(entries, batch_size=1000)
+            RecommendationFeed.objects.bulk_create(
+                [
+                    RecommendationFeed(
+                        user_id=user_id,
+                        dirty=False,
+                        cursor=cursor if user_id in rebuild else feeds[user_id].cursor,
+                        recipe_watermark=latest_recipe,
+                        refreshed_at=now
+                    )
+                    for user_id in rebuild | extend
+                ],
+                update_conflicts=True,
+                unique_fields=['user'],
+                # `dirty` is left alone so edits made during the build still count
+                update_fields=['cursor', 'recipe_watermark', 'refreshed_at']
+            )
+        rebuilt += len(rebuild)
+        extended += len(extend)
+    return rebuilt, extended
+
+
+def mark_feeds_dirty(user_ids):
+    RecommendationFeed.objects.filter(user_id__in=user_ids, dirty=False).update(dirty=True)
@@ -0,0 +1,94 @@
+import hashlib
+from django.db import models, transaction
+from django.db.models import Case, Count, Min, Value, When
+from .costs import recompute_plan_costs
+from .ingredients import normalize_name
+from .models import MealPlanRecipe, Recipe, RecipeAlternative, RecipeIngredient
+from .sync import record_changes
+
+
+def recipe_fingerprint(name, ingredient_ids):
+    """Hash a recipe's normalized name and ingredient set."""
+    key = normalize_name(name) + '|' + ','.join(str(i) for i in sorted(set(ingredient_ids)))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def refresh_fingerprints(recipe_ids):
+    """Recompute and store fingerprints for the given recipes."""
+    recipe_ids = list(recipe_ids)
+    ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+    rows = RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).values_list('recipe_id', 'ingredient_id')
+    for recipe_id, ingredient_id in rows:
+        ingredients[recipe_id].append(ingredient_id)
+
+    recipes = list(Recipe.objects.filter(pk__in=recipe_ids).only('id', 'name', 'fingerprint'))
+    for recipe in recipes:
+        recipe.fingerprint = recipe_fingerprint(recipe.name, ingredients[recipe.pk])
+    Recipe.objects.bulk_update(recipes, ['fingerprint'])
+    return len(recipes)
+
+
+def fill_missing_fingerprints(batch_size=1000, refresh_all=False):
+    """Fingerprint recipes in batches; only those without one unless `refresh_all`."""
+    queryset = Recipe.objects.order_by('id')
+    if not refresh_all:
+        queryset = queryset.filter(fingerprint='')
+
+    total = 0
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return total
+        total += refresh_fingerprints(batch)
+        last_id = batch[-1]
+
+
+def merge_recipes(mapping):
+    """Point meal plan slots at surviving recipes and delete the duplicates.
+
+    `mapping` is {duplicate_id: survivor_id}. Returns (slots, recipes) touched.
+    """
+    duplicates = list(mapping)
+    with transaction.atomic():
+        slots = list(MealPlanRecipe.objects.filter(recipe_id__in=duplicates).values_list(
+            'id', 'meal_plan_id', 'meal_plan__user_id'
+        ))
+        MealPlanRecipe.objects.filter(recipe_id__in=duplicates).update(recipe_id=Case(
+            *[When(recipe_id=duplicate, then=Value(survivor)) for duplicate, survivor in mapping.items()],
+            output_field=models.BigIntegerField()
+        ))
+        # Swap candidates pointing at duplicates are rebuilt by the next refresh
+        RecipeAlternative.objects.filter(alternative_id__in=duplicates).delete()
+        _, deleted = Recipe.objects.filter(pk__in=duplicates).delete()
+        record_changes((user_id, 'meal_plan_recipe', slot_id, 'upsert') for slot_id, _, user_id in slots)
+
+    # Duplicates share ingredients but not necessarily quantities
+    recompute_plan_costs(sorted({plan_id for _, plan_id, _ in slots}))
+    return len(slots), deleted.get(Recipe._meta.label, 0)
+
+
+def compact_recipes(batch_size=500):
+    """Merge generated recipes with identical fingerprints, keeping the oldest of each.
+
+    Recipes saved or edited by users are never merged or deleted.
+    Returns (slots rewired, recipes deleted).
+    """
+    # Materialize the groups first; merging deletes rows the query reads
+    groups = list(Recipe.objects.filter(is_generated=True).exclude(fingerprint='').values('fingerprint').annotate(
+        copies=Count('id'), keep=Min('id')
+    ).filter(copies__gt=1).order_by().values_list('fingerprint', 'keep'))
+
+    slots = deleted = 0
+    for start in range(0, len(groups), batch_size):
+        s, d = _compact_groups(dict(groups[start:start + batch_size]))
+        slots, deleted = slots + s, deleted + d
+    return slots, deleted
+
+
+def _compact_groups(keep):
+    rows = Recipe.objects.filter(is_generated=True, fingerprint__in=list(keep)).exclude(
+        pk__in=list(keep.values())
+    ).values_list('id', 'fingerprint')
+    mapping = {recipe_id: keep[fingerprint] for recipe_id, fingerprint in rows}
+    return merge_recipes(mapping) if mapping else (0, 0)
@@ -0,0 +1,290 @@
+import re
+import threading
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+from .models import Ingredient, RecipeIngredient, UserPantry, UserPreference
+from .sync import record_changes
+
+UNIT_ALIASES = {
+    'g': 'grams', 'gram': 'grams', 'grams': 'grams', 'gr': 'grams',
+    'kg': 'kg', 'kgs': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'oz': 'oz', 'ounce': 'oz', 'ounces': 'oz',
+    'lb': 'lbs', 'lbs': 'lbs', 'pound': 'lbs', 'pounds': 'lbs',
+    'cup': 'cups', 'cups': 'cups', 'c': 'cups',
+    'tbsp': 'tbsp', 'tbs': 'tbsp', 'tablespoon': 'tbsp', 'tablespoons': 'tbsp',
+    'tsp': 'tsp', 'teaspoon': 'tsp', 'teaspoons': 'tsp',
+    'ml': 'ml', 'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml',
+    'l': 'l', 'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l',
+    'piece': 'pieces', 'pieces': 'pieces', 'pc': 'pieces', 'pcs': 'pieces', 'each': 'pieces', 'ea': 'pieces',
+    'clove': 'cloves', 'cloves': 'cloves',
+    'whole': 'whole',
+}
+
+VALID_UNITS = {key for key, _ in Ingredient.UNIT_CHOICES}
+VALID_CATEGORIES = {key for key, _ in Ingredient.CATEGORY_CHOICES}
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_name(name):
+    """Lower-case an ingredient name and collapse its whitespace."""
+    return _WHITESPACE.sub(' ', str(name)).strip().lower()
+
+
+def normalize_unit(unit):
+    """Map a free-form unit onto Ingredient.UNIT_CHOICES, or None if unknown."""
+    if unit is None:
+        return None
+    return UNIT_ALIASES.get(normalize_name(unit).rstrip('.'))
+
+
+def normalize_category(category):
+    category = normalize_name(category or '')
+    return category if category in VALID_CATEGORIES else None
+
+
+# Common synonyms, applied after singularization
+INGREDIENT_ALIASES = {
+    'scallion': 'green onion',
+    'spring onion': 'green onion',
+    'roma tomato': 'tomato',
+    'plum tomato': 'tomato',
+    'garbanzo bean': 'chickpea',
+    'aubergine': 'eggplant',
+    'courgette': 'zucchini',
+    'capsicum': 'bell pepper',
+    'coriander leaf': 'cilantro',
+    'confectioners sugar': 'powdered sugar',
+    'icing sugar': 'powdered sugar',
+}
+
+# Leading words that only describe preparation; words like "whole" or
+# "raw" can change what the ingredient is and are kept
+MODIFIERS = {
+    'chopped', 'diced', 'minced', 'sliced', 'peeled',
+    'finely', 'roughly', 'freshly',
+}
+
+IRREGULAR_PLURALS = {
+    'leaves': 'leaf',
+    'loaves': 'loaf',
+    'halves': 'half',
+    'knives': 'knife',
+}
+
+# Words that end in "s" but are not plurals
+_SINGULAR_S = ('ss', 'us', 'is', 'ous')
+_PUNCTUATION = re.compile(r"[^\w\s-]")
+
+
+def singularize(word):
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if len(word) <= 3 or word.endswith(_SINGULAR_S):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'xes', 'sses')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def canonical_name(name):
+    """Reduce an ingredient name to the key used to detect duplicates.
+
+    "Tomatoes", " tomato " and "Roma Tomatoes" all become "tomato".
+    """
+    words = _PUNCTUATION.sub('', normalize_name(name)).split()
+    while len(words) > 1 and words[0] in MODIFIERS:
+        words = words[1:]
+    if not words:
+        return ''
+    words[-1] = singularize(words[-1])
+    canonical = ' '.join(words)
+    return INGREDIENT_ALIASES.get(canonical, canonical)
+
+
+class IngredientIndex:
+    """In-memory map from canonical names to (id, stored name)."""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.entries = {}
+
+    @classmethod
+    def load(cls, version=None):
+        index = cls(version)
+        rows = Ingredient.objects.order_by('id').values_list('id', 'name').iterator(chunk_size=5000)
+        for ingredient_id, name in rows:
+            # The oldest row wins until duplicates are merged
+            index.entries.setdefault(canonical_name(name), (ingredient_id, name))
+        return index
+
+    def add(self, ingredient_id, name):
+        self.entries.setdefault(canonical_name(name), (ingredient_id, name))
+
+    def lookup(self, name):
+        return self.entries.get(canonical_name(name))
+
+
+INDEX_VERSION_KEY = 'api:ingredient-index-version'
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _current_version():
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(INDEX_VERSION_KEY, 1, None)
+        version = cache.get(INDEX_VERSION_KEY, 1)
+    return version
+
+
+def bump_index_version():
+    """Tell every worker to reload its index on next use."""
+    try:
+        return cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(INDEX_VERSION_KEY, 2, None)
+        return 2
+
+
+def get_index():
+    """Return this worker's index, reloading it if ingredients changed elsewhere."""
+    global _index
+    version = _current_version()
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = IngredientIndex.load(version)
+        return _index
+
+
+def _add_to_index(ingredient_id, name):
+    global _index
+    version = bump_index_version()
+    with _index_lock:
+        if _index is not None and _index.version == version - 1:
+            _index.add(ingredient_id, name)
+            _index.version = version
+
+
+def index_added(ingredient_id, name):
+    """Record a new ingredient locally and invalidate other workers' indexes.
+
+    Deferred until the surrounding transaction commits, so an insert that
+    is rolled back never reaches any index.
+    """
+    transaction.on_commit(lambda: _add_to_index(ingredient_id, name))
+
+
+def resolve_ingredients(items):
+    """Resolve (name, unit) pairs to ingredient ids, creating missing ones.
+
+    Returns {name: ingredient_id}. Names that canonicalize to the same key
+    share one ingredient, and all new ingredients are created in a single
+    bulk insert.
+    """
+    index = get_index()
+    resolved = {}
+    missing = {}
+    for name, unit in items:
+        entry = index.lookup(name)
+        if entry is not None:
+            resolved[name] = entry[0]
+        else:
+            missing.setdefault(canonical_name(name) or normalize_name(name), (unit, []))[1].append(name)
+
+    if missing:
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(
+                    name=canonical[:100],
+                    unit=normalize_unit(unit) or 'pieces',
+                    category='other',
+                    cost_per_unit=0
+                )
+                for canonical, (unit, _) in missing.items()
+            ],
+            ignore_conflicts=True
+        )
+        # Fetch ids by name: ignore_conflicts doesn't return them and another
+        # worker may have created some of these rows first
+        created = dict(Ingredient.objects.filter(
+            name__in=[canonical[:100] for canonical in missing]
+        ).values_list('name', 'id'))
+        for canonical, (_, names) in missing.items():
+            ingredient_id = created[canonical[:100]]
+            index_added(ingredient_id, canonical[:100])
+            for name in names:
+                resolved[name] = ingredient_id
+    return resolved
+
+
+def find_duplicate_ingredients():
+    """Return {duplicate_id: survivor_id} for ingredients sharing a canonical name.
+
+    The survivor is the priced ingredient if any, otherwise the oldest.
+    """
+    groups = {}
+    rows = Ingredient.objects.order_by('id').values_list('id', 'name', 'cost_per_unit').iterator(chunk_size=5000)
+    for ingredient_id, name, cost in rows:
+        groups.setdefault(canonical_name(name), []).append((ingredient_id, cost))
+
+    mapping = {}
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        survivor = min(members, key=lambda m: (m[1] <= 0, m[0]))[0]
+        for ingredient_id, _ in members:
+            if ingredient_id != survivor:
+                mapping[ingredient_id] = survivor
+    return mapping
+
+
+def _repoint(queryset, field, mapping):
+    """Rewrite `field` from duplicate to survivor ids with a single UPDATE."""
+    return queryset.filter(**{f'{field}__in': list(mapping)}).update(**{
+        field: Case(
+            *[When(**{field: duplicate}, then=Value(survivor)) for duplicate, survivor in mapping.items()],
+            output_field=models.BigIntegerField()
+        )
+    })
+
+
+def merge_ingredients(mapping):
+    """Repoint references from duplicate ingredients to survivors and delete the duplicates.
+
+    `mapping` is {duplicate_id: survivor_id}; callers should keep it to a
+    few hundred entries per call. Returns a dict of rows touched per table.
+    """
+    Disliked = UserPreference.disliked_ingredients.through
+    with transaction.atomic():
+        pantry_rows = list(UserPantry.objects.filter(
+            ingredient_id__in=list(mapping)
+        ).values_list('id', 'user_id'))
+
+        counts = {
+            'recipe_ingredients': _repoint(RecipeIngredient.objects.all(), 'ingredient_id', mapping),
+            'pantry': _repoint(UserPantry.objects.all(), 'ingredient_id', mapping),
+        }
+
+        # The M2M table is unique per (preference, ingredient), so rows are
+        # replaced instead of updated in place
+        disliked = list(Disliked.objects.filter(
+            ingredient_id__in=list(mapping)
+        ).values_list('id', 'userpreference_id', 'ingredient_id'))
+        Disliked.objects.filter(pk__in=[row[0] for row in disliked]).delete()
+        Disliked.objects.bulk_create(
+            [Disliked(userpreference_id=pref_id, ingredient_id=mapping[ing_id]) for _, pref_id, ing_id in disliked],
+            ignore_conflicts=True
+        )
+        counts['disliked_ingredients'] = len(disliked)
+
+        record_changes((user_id, 'pantry', pantry_id, 'upsert') for pantry_id, user_id in pantry_rows)
+        _, deleted = Ingredient.objects.filter(pk__in=list(mapping)).delete()
+        counts['ingredients'] = deleted.get(Ingredient._meta.label, 0)
+    return counts
@@ -0,0 +1,206 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer
+
+_current = contextvars.ContextVar('api_request_metrics', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class RequestMetrics:
+    """Timing spans and counters for the request being handled."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.active = set()
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add_span(self, name, seconds):
+        with self.lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def add_query(self, seconds):
+        with self.lock:
+            self.db_time += seconds
+            self.db_queries += 1
+
+    def add_llm_call(self, prompt_tokens, completion_tokens):
+        with self.lock:
+            self.llm_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+
+def current():
+    return _current.get()
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+_NO_SPAN = nullcontext()
+
+
+def span(name):
+    """Time a block as `name` for the current request; a no-op otherwise.
+
+    Nested spans of the same name count once, and database time spent
+    inside the block is excluded so `db` is not double counted.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return _NO_SPAN
+    return _timed_span(metrics, name)
+
+
+@contextmanager
+def _timed_span(metrics, name):
+    # Keyed by thread so parallel LLM workers each record their own span
+    key = (threading.get_ident(), name)
+    if key in metrics.active:
+        yield
+        return
+    metrics.active.add(key)
+    db_before = metrics.db_time
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start - (metrics.db_time - db_before)
+        metrics.active.discard(key)
+        metrics.add_span(name, max(elapsed, 0.0))
+
+
+def record_llm_call(prompt_tokens, completion_tokens):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_llm_call(prompt_tokens, completion_tokens)
+
+
+def query_timer(execute, sql, params, many, context):
+    """Database execute wrapper feeding the current request's db span."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - start)
+
+
+def run_in_context(pool, fn, *args):
+    """Submit `fn` to a thread pool so its spans count towards this request."""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+class TimedSerializerMixin:
+    """Record serializer output time as the `serialize` span.
+
+    Only the top-level serializer (or each item of a top-level list) is
+    timed; nested serializers already run inside its span.
+    """
+
+    def to_representation(self, instance):
+        if _current.get() is None:
+            return super().to_representation(instance)
+        root = self.root
+        if root is not self and not (self.parent is root and isinstance(root, ListSerializer)):
+            return super().to_representation(instance)
+        with span('serialize'):
+            return super().to_representation(instance)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with span('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class MetricsRegistry:
+    """Process-wide aggregates of request metrics, rendered for Prometheus."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.spans = {}
+        self.counters = {}
+
+    def observe(self, view, method, duration, metrics):
+        with self.lock:
+            key = (view, method)
+            entry = self.requests.setdefault(key, {'count': 0, 'sum': 0.0, 'buckets': [0] * len(DURATION_BUCKETS)})
+            entry['count'] += 1
+            entry['sum'] += duration
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    entry['buckets'][i] += 1
+
+            spans = dict(metrics.spans, db=metrics.db_time)
+            for name, seconds in spans.items():
+                self.spans[(view, name)] = self.spans.get((view, name), 0.0) + seconds
+            for name, value in (
+                ('api_db_queries_total', metrics.db_queries),
+                ('api_llm_calls_total', metrics.llm_calls),
+                ('api_llm_prompt_tokens_total', metrics.prompt_tokens),
+                ('api_llm_completion_tokens_total', metrics.completion_tokens),
+            ):
+                self.counters[(name, view)] = self.counters.get((name, view), 0) + value
+
+    def render(self):
+        lines = [
+            '# HELP api_request_duration_seconds Request latency by view',
+            '# TYPE api_request_duration_seconds histogram',
+        ]
+        with self.lock:
+            for (view, method), entry in sorted(self.requests.items()):
+                labels = f'view="{view}",method="{method}"'
+                for bound, count in zip(DURATION_BUCKETS, entry['buckets']):
+                    lines.append(f'api_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'api_request_duration_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+                lines.append(f'api_request_duration_seconds_sum{{{labels}}} {entry["sum"]:.6f}')
+                lines.append(f'api_request_duration_seconds_count{{{labels}}} {entry["count"]}')
+
+            lines.append('# HELP api_request_span_seconds_total Time per request phase (db, serialize, render, llm, parse)')
+            lines.append('# TYPE api_request_span_seconds_total counter')
+            for (view, name), seconds in sorted(self.spans.items()):
+                lines.append(f'api_request_span_seconds_total{{view="{view}",span="{name}"}} {seconds:.6f}')
+
+            seen = set()
+            for (name, view), value in sorted(self.counters.items()):
+                if name not in seen:
+                    lines.append(f'# TYPE {name} counter')
+                    seen.add(name)
+                lines.append(f'{name}{{view="{view}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def server_timing(metrics, total):
+    """Format the request's spans as a Server-Timing header value (ms).
+
+    Spans recorded by parallel LLM workers are summed, so `llm` can exceed `total`.
+    """
+    parts = [f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.db_queries} queries"']
+    for name, seconds in sorted(metrics.spans.items()):
+        parts.append(f'{name};dur={seconds * 1000:.1f}')
+    if metrics.llm_calls:
+        parts.append(f'tokens;desc="{metrics.prompt_tokens}+{metrics.completion_tokens}"')
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
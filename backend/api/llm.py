@@ -0,0 +1,66 @@
+import logging
+import time
+import openai
+from django.conf import settings
+from . import instrumentation
+
+try:
+    import tiktoken
+except ImportError:  # optional; token counts fall back to an estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+_encodings = {}
+
+
+def count_tokens(text, model=None):
+    """Count tokens with tiktoken when installed, else estimate ~4 chars per token."""
+    model = model or settings.LLM_MODEL
+    if tiktoken is not None:
+        encoding = _encodings.get(model)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding('cl100k_base')
+            _encodings[model] = encoding
+        return len(encoding.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+
+def _openai_backend(**kwargs):
+    return openai.chat.completions.create(**kwargs)
+
+
+# Replaceable so benchmarks and local runs can use a fake model
+backend = _openai_backend
+
+
+def chat(endpoint, system, prompt, **kwargs):
+    """Send one chat completion and return the response text.
+
+    Prompt/completion tokens and latency are logged per `endpoint`.
+    """
+    kwargs.setdefault('model', settings.LLM_MODEL)
+    start = time.perf_counter()
+    with instrumentation.span('llm'):
+        response = backend(
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt}
+            ],
+            **kwargs
+        )
+    latency = time.perf_counter() - start
+
+    content = response.choices[0].message.content or ''
+    usage = getattr(response, 'usage', None)
+    prompt_tokens = getattr(usage, 'prompt_tokens', None) or count_tokens(system + prompt)
+    completion_tokens = getattr(usage, 'completion_tokens', None) or count_tokens(content)
+    instrumentation.record_llm_call(prompt_tokens, completion_tokens)
+    logger.info(
+        'llm endpoint=%s model=%s prompt_tokens=%d completion_tokens=%d latency_ms=%.0f',
+        endpoint, kwargs['model'], prompt_tokens, completion_tokens, latency * 1000
+    )
+    return content
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from api.costs import recompute_plan_costs
+from api.models import MealPlan
+
+
+class Command(BaseCommand):
+    help = 'Recompute MealPlan.total_cost for all existing plans in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        plan_ids = MealPlan.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size)
+
+        updated = 0
+        batch = []
+        for plan_id in plan_ids:
+            batch.append(plan_id)
+            if len(batch) >= batch_size:
+                updated += recompute_plan_costs(batch, batch_size)
+                batch = []
+        updated += recompute_plan_costs(batch, batch_size)
+
+        self.stdout.write(self.style.SUCCESS(f'Updated total_cost on {updated} meal plans'))
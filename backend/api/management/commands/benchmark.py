@@ -0,0 +1,86 @@
+import json
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from api.benchmarks import runner
+from api.benchmarks.data import generate_dataset
+from api.benchmarks.fake_llm import FakeLLM, fake_backend
+from api.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the API hot paths against a synthetic data set in a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--ingredients', type=int, default=300)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--pantry-rows', type=int, default=30, help='Pantry rows per user')
+        parser.add_argument('--plans', type=int, default=2, help='Meal plans per user')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--llm-latency', type=float, default=0.0, help='Seconds the fake LLM waits per call')
+        parser.add_argument('--only', nargs='*', help='Scenario names to run')
+        parser.add_argument('--output-dir', default=str(settings.BASE_DIR / 'benchmark_results'))
+        parser.add_argument('--compare', help='Results file to compare with, or "latest"')
+        parser.add_argument('--no-save', action='store_true')
+
+    def handle(self, *args, **options):
+        baseline_path = options['compare']
+        if baseline_path == 'latest':
+            baseline_path = runner.latest_results(options['output_dir'])
+            if baseline_path is None:
+                raise CommandError(f'No earlier results in {options["output_dir"]}')
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write('Generating data...')
+            dataset = generate_dataset(
+                users=options['users'],
+                ingredients=options['ingredients'],
+                recipes=options['recipes'],
+                pantry_rows=options['pantry_rows'],
+                plans=options['plans'],
+                seed=options['seed'],
+            )
+            params = dict(
+                dataset['params'],
+                iterations=options['iterations'],
+                concurrency=options['concurrency'],
+                llm_latency=options['llm_latency'],
+                database=connection.vendor,
+            )
+            names = Ingredient.objects.values_list('name', flat=True)[:50]
+            # Per-call LLM logging would swamp the report
+            logging.getLogger('api.llm').setLevel(logging.WARNING)
+            with fake_backend(FakeLLM(names, latency=options['llm_latency'])):
+                results = runner.run_suite(
+                    dataset,
+                    iterations=options['iterations'],
+                    concurrency=options['concurrency'],
+                    only=options['only'],
+                    log=self.stdout.write,
+                )
+            payloads = runner.measure_payloads(dataset)
+            for name, row in payloads.items():
+                self.stdout.write(runner.format_payload_row(name, row))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if not options['no_save']:
+            path = runner.save_results(results, params, options['output_dir'], payloads)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {path}'))
+
+        if baseline_path:
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            self.stdout.write(f'Compared with {baseline["commit"]} ({baseline_path}):')
+            for line in runner.compare(baseline['scenarios'], results):
+                self.stdout.write(line)
+            for line in runner.compare_payloads(baseline.get('payloads', {}), payloads):
+                self.stdout.write(line)
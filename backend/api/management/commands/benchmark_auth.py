@@ -0,0 +1,60 @@
+import base64
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from api.authentication import CachedTokenAuthentication, invalidate_token
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request authentication overhead for each auth scheme'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        factory = APIRequestFactory()
+
+        # Work inside a transaction that is rolled back so no data is kept
+        with transaction.atomic():
+            user = User.objects.create_user('benchmark-auth-user', password='benchmark-password')
+            token = Token.objects.create(user=user)
+            basic = base64.b64encode(b'benchmark-auth-user:benchmark-password').decode()
+
+            schemes = [
+                ('token', TokenAuthentication, f'Token {token.key}'),
+                ('cached token', CachedTokenAuthentication, f'Token {token.key}'),
+                ('basic', BasicAuthentication, f'Basic {basic}'),
+            ]
+            invalidate_token(token.key)
+            for name, auth_class, header in schemes:
+                self._run(name, auth_class, header, factory, iterations)
+
+            invalidate_token(token.key)
+            transaction.set_rollback(True)
+
+    def _run(self, name, auth_class, header, factory, iterations):
+        def authenticate():
+            request = Request(
+                factory.get('/api/recipes/', HTTP_AUTHORIZATION=header),
+                authenticators=[auth_class()]
+            )
+            assert request.user.is_authenticated
+
+        authenticate()  # warm caches
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                authenticate()
+            elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f'{name:>14}: {elapsed / iterations * 1e6:10.1f} us/request, '
+            f'{len(queries) / iterations:.2f} queries/request'
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from api.fingerprints import compact_recipes, fill_missing_fingerprints
+
+
+class Command(BaseCommand):
+    help = 'Fingerprint recipes and merge duplicates, rewiring meal plans to the kept copy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--refresh', action='store_true', help='Recompute every fingerprint, not just missing ones')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fingerprinted = fill_missing_fingerprints(batch_size, options['refresh'])
+        self.stdout.write(f'Fingerprinted {fingerprinted} recipes')
+
+        slots, deleted = compact_recipes(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} duplicate recipes and rewired {slots} meal plan slots'
+        ))
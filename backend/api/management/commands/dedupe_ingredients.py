@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from api.costs import recompute_costs_for_ingredients
+from api.fingerprints import refresh_fingerprints
+from api.ingredients import bump_index_version, find_duplicate_ingredients, merge_ingredients
+from api.models import RecipeIngredient
+
+
+class Command(BaseCommand):
+    help = 'Merge ingredients whose names differ only by case, plurals, whitespace or aliases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        mapping = find_duplicate_ingredients()
+        survivors = set(mapping.values())
+        self.stdout.write(f'Found {len(mapping)} duplicates of {len(survivors)} ingredients')
+        if options['dry_run'] or not mapping:
+            return
+
+        totals = {}
+        items = list(mapping.items())
+        batch_size = options['batch_size']
+        for start in range(0, len(items), batch_size):
+            counts = merge_ingredients(dict(items[start:start + batch_size]))
+            for table, count in counts.items():
+                totals[table] = totals.get(table, 0) + count
+
+        bump_index_version()
+        plans = recompute_costs_for_ingredients(survivors)
+        # Recipes now list the surviving ids, so their fingerprints changed
+        survivor_list = sorted(survivors)
+        for start in range(0, len(survivor_list), batch_size):
+            refresh_fingerprints(RecipeIngredient.objects.filter(
+                ingredient_id__in=survivor_list[start:start + batch_size]
+            ).values_list('recipe_id', flat=True).distinct())
+        for table, count in totals.items():
+            self.stdout.write(f'{table}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Merged duplicates; recomputed {plans} meal plan costs'))
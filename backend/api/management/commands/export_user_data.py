@@ -0,0 +1,36 @@
+import sys
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from api.exports import DEFAULT_CHUNK_SIZE, SECTIONS, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream a user's meal plans, pantry, pantry history and shopping lists to CSV or JSON lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='Username or user id')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='jsonl', dest='file_format')
+        parser.add_argument('--section', action='append', dest='sections', choices=list(SECTIONS),
+                            help='Section to export (repeatable; CSV takes exactly one)')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        lookup = {'pk': options['user']} if options['user'].isdigit() else {'username': options['user']}
+        user = User.objects.filter(**lookup).first()
+        if user is None:
+            raise CommandError(f'No user {options["user"]}')
+
+        sections = options['sections'] or (['meal_plans'] if options['file_format'] == 'csv' else list(SECTIONS))
+        if options['file_format'] == 'csv' and len(sections) > 1:
+            raise CommandError('CSV exports contain a single section')
+
+        chunks = stream_export(user, options['file_format'], sections, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f'Exported {", ".join(sections)} to {options["output"]}'))
+        else:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from api.retention import archive_old_plans, collect_orphaned_recipes
+
+
+class Command(BaseCommand):
+    help = 'Archive old meal plans and delete generated recipes no plan uses any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, help='Default: MEAL_PLAN_RETENTION_DAYS')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--skip-archive', action='store_true')
+        parser.add_argument('--skip-recipes', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_archive']:
+            plans, slots = archive_old_plans(options['retention_days'], options['batch_size'], options['pause'])
+            self.stdout.write(self.style.SUCCESS(f'Archived {plans} meal plans ({slots} slots)'))
+
+        # Runs after archiving so recipes only used by archived plans are collected too
+        if not options['skip_recipes']:
+            reclaimed = collect_orphaned_recipes(options['batch_size'], options['pause'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Deleted {reclaimed.get("api.Recipe", 0)} orphaned recipes'
+            ))
+            for label, count in sorted(reclaimed.items()):
+                self.stdout.write(f'  {label}: {count} rows')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.prices import PriceImporter, open_price_file, price_file_format, read_price_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream an ingredient price file (CSV or JSON lines, optionally gzipped) into Ingredient'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--skip-recompute', action='store_true', help='Do not recompute plan costs afterwards')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or price_file_format(path)
+
+        importer = PriceImporter(options['batch_size'])
+        try:
+            with open_price_file(path) as handle:
+                importer.run(read_price_rows(handle, file_format))
+            importer.finish()
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not import {path}: {e}')
+
+        self.stdout.write(
+            f'Read {importer.read} rows, upserted {importer.upserted}, skipped {importer.skipped} '
+            f'({importer.malformed} malformed lines, {importer.unit_mismatches} in a different unit)'
+        )
+        if not options['skip_recompute']:
+            plans, recipes = importer.recompute_costs()
+            self.stdout.write(f'Recomputed {plans} meal plan costs and alternatives for {recipes} recipes')
+        self.stdout.write(self.style.SUCCESS('Import finished'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from api.alternatives import ALTERNATIVES_PER_RECIPE, refresh_alternatives
+
+
+class Command(BaseCommand):
+    help = 'Precompute swap candidates for recipes (similar cost, compatible diet, shared ingredients)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipe', type=int, action='append', dest='recipes', help='Only refresh these recipe ids')
+        parser.add_argument('--limit', type=int, default=ALTERNATIVES_PER_RECIPE)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        refreshed = refresh_alternatives(options['recipes'], options['limit'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed alternatives for {refreshed} recipes'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from api.feed import refresh_feeds
+
+
+class Command(BaseCommand):
+    help = 'Rebuild stale per-user recommendation feeds and merge in newly added recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only refresh these user ids')
+        parser.add_argument('--full', action='store_true', help='Rescore every feed, e.g. after recipe or price edits')
+        parser.add_argument('--size', type=int, help='Recipes kept per feed (default: RECOMMENDATION_FEED_SIZE)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        rebuilt, extended = refresh_feeds(
+            options['users'], options['full'], options['size'], options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rebuilt} feeds and merged new recipes into {extended}'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.expiry import scan_expiring_items
+
+
+class Command(BaseCommand):
+    help = 'Precompute per-user digests of pantry items that are expiring soon'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Expiry window in days (default: PANTRY_EXPIRY_WINDOW_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = scan_expiring_items(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Built expiry digests for {users} users with expiring items'))
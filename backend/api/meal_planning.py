@@ -0,0 +1,207 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from . import llm, prompts
+from .instrumentation import run_in_context
+from .costs import recompute_plan_costs
+from .fingerprints import recipe_fingerprint
+from .ingredients import resolve_ingredients
+from .models import MealPlan, MealPlanRecipe, Recipe, RecipeIngredient
+from .parsing import LLMOutputError, extract_json, parse_meals
+from .sync import record_changes
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are a helpful meal planning assistant."
+# Bounds on generate requests; a day holds one meal of each type
+MAX_PLAN_DAYS = 14
+MAX_MEALS_PER_DAY = 4
+
+
+def expected_slots(days, meals_per_day, only_day=None):
+    return [
+        (day, meal_type)
+        for day in ([only_day] if only_day else range(1, days + 1))
+        for meal_type in prompts.meal_types(meals_per_day)
+    ]
+
+
+def request_meals(prompt, wanted, endpoint='meal_plans.generate'):
+    """Ask the model for the `wanted` (day, meal_type) slots, salvaging partial output.
+
+    Valid meals are kept from every reply; only slots still missing are
+    requested again, up to LLM_MAX_FOLLOW_UPS times. This makes no
+    database queries, so it is safe to run in worker threads.
+    Returns (meals, missing).
+    """
+    plan = {}
+    request_prompt = prompt
+    for attempt in range(settings.LLM_MAX_FOLLOW_UPS + 1):
+        content = llm.chat(endpoint if attempt == 0 else f'{endpoint}.follow_up', SYSTEM_PROMPT, request_prompt)
+        try:
+            meals, _ = parse_meals(content)
+        except LLMOutputError:
+            meals = []
+        for meal in meals:
+            slot = (meal['day'], meal['meal_type'])
+            if slot in wanted and slot not in plan:
+                plan[slot] = meal
+
+        missing = [slot for slot in wanted if slot not in plan]
+        if not missing:
+            break
+        request_prompt = prompts.missing_meals_prompt(prompt, missing)
+
+    return [plan[slot] for slot in wanted if slot in plan], missing
+
+
+def ingredient_palette(days, preferences, pantry_items):
+    """Pick the ingredients every day of a fanned-out plan should share.
+
+    Pantry items (soonest expiry first) are used when there are enough;
+    otherwise one short completion suggests the palette.
+    """
+    size = settings.LLM_PALETTE_SIZE
+    ranked = sorted(
+        pantry_items,
+        key=lambda item: (item.expiry_date is None, item.expiry_date or 0, -item.quantity)
+    )
+    palette = [item.ingredient.name for item in ranked[:size]]
+    if len(palette) >= size // 2:
+        return palette
+
+    prompt = prompts.palette_prompt(days, preferences, pantry_items, size)
+    try:
+        suggested = extract_json(llm.chat('meal_plans.generate.palette', SYSTEM_PROMPT, prompt, max_tokens=200))
+    except LLMOutputError:
+        return palette
+    if isinstance(suggested, list):
+        palette.extend(str(name) for name in suggested if isinstance(name, str))
+    return palette[:size]
+
+
+def generate_meals(days, meals_per_day, preferences, pantry_items, parallel=False):
+    """Get validated meals for a plan, optionally one concurrent request per day.
+
+    With `parallel`, each day is requested separately (sharing an
+    ingredient palette) on a bounded thread pool, so wall-clock time is
+    close to that of a single day's completion. Returns (meals, missing).
+    """
+    pantry_items = list(pantry_items)
+    if not parallel or days == 1:
+        prompt = prompts.meal_plan_prompt(days, meals_per_day, preferences, pantry_items)
+        return request_meals(prompt, expected_slots(days, meals_per_day))
+
+    # Prompts are built here: worker threads must not touch the database
+    palette = ingredient_palette(days, preferences, pantry_items)
+    day_prompts = {
+        day: prompts.meal_plan_prompt(days, meals_per_day, preferences, pantry_items, day=day, palette=palette)
+        for day in range(1, days + 1)
+    }
+
+    meals = []
+    missing = []
+    with ThreadPoolExecutor(max_workers=min(settings.LLM_MAX_CONCURRENCY, days)) as pool:
+        futures = {
+            day: run_in_context(
+                pool, request_meals, prompt, expected_slots(days, meals_per_day, day), 'meal_plans.generate.day'
+            )
+            for day, prompt in day_prompts.items()
+        }
+        for day, future in futures.items():
+            try:
+                day_meals, day_missing = future.result()
+            except Exception:
+                logger.exception('Meal plan request for day %s failed', day)
+                day_meals, day_missing = [], expected_slots(days, meals_per_day, day)
+            meals.extend(day_meals)
+            missing.extend(day_missing)
+    return meals, missing
+
+
+def persist_meal_plan(user, days, meals):
+    """Store a generated plan, its recipes and its cost in one transaction."""
+    start_date = datetime.now().date()
+    end_date = start_date + timedelta(days=days-1)
+
+    with transaction.atomic():
+        meal_plan = MealPlan.objects.create(
+            user=user,
+            start_date=start_date,
+            end_date=end_date,
+            total_cost=0  # Calculated once all recipes are stored
+        )
+
+        # Resolve every ingredient in the plan at once, merging spelling
+        # variants onto existing ingredients
+        ingredient_ids = resolve_ingredients(
+            (ing_data['name'], ing_data['unit'])
+            for meal in meals
+            for ing_data in meal['recipe']['ingredients']
+        )
+
+        # Reuse stored recipes with the same name and ingredient set
+        # instead of creating a copy per generation
+        fingerprints = [
+            recipe_fingerprint(
+                meal['recipe']['name'],
+                [ingredient_ids[ing_data['name']] for ing_data in meal['recipe']['ingredients']]
+            )
+            for meal in meals
+        ]
+        # Locked so orphan collection can't delete a recipe this plan is about
+        # to reuse; ascending id order matches the collector's locking order
+        existing = {}
+        for fingerprint, recipe_id in (
+            Recipe.objects.select_for_update().filter(fingerprint__in=fingerprints)
+            .order_by('id')
+            .values_list('fingerprint', 'id')
+        ):
+            existing.setdefault(fingerprint, recipe_id)
+
+        recipe_ingredients = []
+        slots = []
+        for meal, fingerprint in zip(meals, fingerprints):
+            recipe_data = meal['recipe']
+
+            if fingerprint not in existing:
+                recipe = Recipe.objects.create(
+                    name=recipe_data['name'],
+                    description=recipe_data['description'],
+                    instructions=recipe_data['instructions'],
+                    prep_time=recipe_data.get('prep_time') or 30,
+                    cook_time=recipe_data.get('cook_time') or 30,
+                    servings=recipe_data.get('servings') or 4,
+                    fingerprint=fingerprint,
+                    is_generated=True
+                )
+                existing[fingerprint] = recipe.pk
+
+                recipe_ingredients.extend(
+                    RecipeIngredient(
+                        recipe=recipe,
+                        ingredient_id=ingredient_ids[ing_data['name']],
+                        quantity=ing_data['quantity'],
+                        unit=ing_data['unit']
+                    )
+                    for ing_data in recipe_data['ingredients']
+                )
+
+            slots.append(MealPlanRecipe(
+                meal_plan=meal_plan,
+                recipe_id=existing[fingerprint],
+                day=meal['day'],
+                meal_type=meal['meal_type']
+            ))
+
+        # Bulk inserts skip the per-row signals; the plan cost and the
+        # sync log are updated explicitly below
+        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        slots = MealPlanRecipe.objects.bulk_create(slots)
+        record_changes((user.pk, 'meal_plan_recipe', slot.pk, 'upsert') for slot in slots)
+
+        recompute_plan_costs([meal_plan.pk])
+        meal_plan.refresh_from_db(fields=['total_cost', 'updated_at'])
+    return meal_plan
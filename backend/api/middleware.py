@@ -0,0 +1,110 @@
+import gzip
+import re
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from . import instrumentation
+
+try:
+    import brotli
+except ImportError:  # optional; responses fall back to gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript')
+# Entries with a malformed q value don't match and are ignored
+_ENCODING = re.compile(r'\s*([a-z*-]+)\s*(?:;\s*q=([01](?:\.\d{0,3})?))?\s*$', re.IGNORECASE)
+
+
+class TimingMiddleware:
+    """Record per-request timing spans, Prometheus metrics and Server-Timing.
+
+    Installed but inert unless API_TIMING_ENABLED is set, in which case
+    Django drops it from the middleware chain entirely.
+    """
+
+    def __init__(self, get_response):
+        if not settings.API_TIMING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics, token = instrumentation.start_request()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(instrumentation.query_timer))
+                response = self.get_response(request)
+        finally:
+            instrumentation.end_request(token)
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        instrumentation.registry.observe(view, request.method, total, metrics)
+        if settings.API_SERVER_TIMING_HEADER:
+            response['Server-Timing'] = instrumentation.server_timing(metrics, total)
+        return response
+
+
+def accepted_encodings(header):
+    """Return the encodings in an Accept-Encoding header with q > 0."""
+    accepted = set()
+    for part in (header or '').split(','):
+        match = _ENCODING.match(part)
+        if match and float(match.group(2) or 1) > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=settings.API_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.API_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """Brotli or gzip encode responses of at least API_COMPRESSION_MIN_BYTES.
+
+    Brotli is used when installed and accepted by the client. Small
+    bodies, streaming responses and non-text content are sent as is.
+    """
+
+    def __init__(self, get_response):
+        if not settings.API_COMPRESSION_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.API_COMPRESSION_MIN_BYTES:
+            return response
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        else:
+            return response
+
+        with instrumentation.span('compress'):
+            compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The entity changed, so a strong ETag no longer matches it
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
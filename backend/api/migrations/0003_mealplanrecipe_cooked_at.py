@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-19 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_changelog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealplanrecipe',
+            name='cooked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-19 14:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_mealplanrecipe_cooked_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpiryDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_days', models.IntegerField()),
+                ('scan_date', models.DateField()),
+                ('items', models.JSONField(default=list)),
+                ('item_count', models.IntegerField(default=0)),
+                ('earliest_expiry', models.DateField(blank=True, null=True)),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('generated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userpantry',
+            index=models.Index(fields=['expiry_date', 'user'], name='api_userpan_expiry__fe388f_idx'),
+        ),
+        migrations.AddField(
+            model_name='expirydigest',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
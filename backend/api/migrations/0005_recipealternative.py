@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-19 14:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_expirydigest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeAlternative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.IntegerField()),
+                ('score', models.FloatField()),
+                ('cost_delta', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('alternative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.recipe')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alternatives', to='api.recipe')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recipe', 'rank'], name='api_recipea_recipe__9b3817_idx')],
+                'unique_together': {('recipe', 'alternative')},
+            },
+        ),
+    ]
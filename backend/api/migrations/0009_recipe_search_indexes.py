@@ -0,0 +1,35 @@
+from django.db import migrations
+
+# PostgreSQL only: the expression indexes behind the admin's recipe search.
+# The GIN expression must match SearchVector('name', 'description', config='english').
+CREATE_SQL = [
+    "CREATE INDEX IF NOT EXISTS api_recipe_search ON api_recipe USING GIN "
+    "(to_tsvector('english'::regconfig, COALESCE(name, '') || ' ' || COALESCE(description, '')))",
+    "CREATE INDEX IF NOT EXISTS api_recipe_name_prefix ON api_recipe (UPPER(name) varchar_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS api_ingredient_name_prefix ON api_ingredient (UPPER(name) varchar_pattern_ops)",
+]
+DROP_SQL = [
+    "DROP INDEX IF EXISTS api_recipe_search",
+    "DROP INDEX IF EXISTS api_recipe_name_prefix",
+    "DROP INDEX IF EXISTS api_ingredient_name_prefix",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_archivedmealplan'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
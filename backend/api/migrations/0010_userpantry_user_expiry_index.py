@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-19 14:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_recipe_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='userpantry',
+            name='api_userpan_expiry__fe388f_idx',
+        ),
+        migrations.AddIndex(
+            model_name='userpantry',
+            index=models.Index(fields=['user', 'expiry_date'], name='api_userpan_user_id_e9f68f_idx'),
+        ),
+    ]
@@ -56,6 +56,11 @@ class UserPantry(models.Model):
     added_date = models.DateTimeField(auto_now_add=True)
     updated_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'expiry_date']),
+        ]
+
     def __str__(self):
         return f"{self.quantity} {self.ingredient.unit} of {self.ingredient.name} for {self.user.username}"
 
@@ -67,6 +72,10 @@ class Recipe(models.Model):
     cook_time = models.IntegerField()  # in minutes
     servings = models.IntegerField()
     ingredients = models.ManyToManyField(Ingredient, through='RecipeIngredient')
+    # Hash of the normalized name and ingredient set, used to reuse identical recipes
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+    # Created by meal plan generation; deleted by gc_meal_plans once no plan uses it
+    is_generated = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -146,6 +155,112 @@ class MealPlanRecipe(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
     day = models.IntegerField()  # 1-7 for Monday-Sunday
     meal_type = models.CharField(max_length=20)  # e.g., 'breakfast', 'lunch', 'dinner'
+    cooked_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.meal_type} on day {self.day} for {self.meal_plan}"
+
+class ChangeLog(models.Model):
+    ENTITY_CHOICES = [
+        ('pantry', 'Pantry Item'),
+        ('meal_plan', 'Meal Plan'),
+        ('meal_plan_recipe', 'Meal Plan Recipe'),
+    ]
+
+    ACTION_CHOICES = [
+        ('upsert', 'Created or Updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    # The auto-increment id doubles as the sync watermark handed to clients
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.entity} #{self.object_id} for {self.user.username}"
+
+class ExpiryDigest(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    window_days = models.IntegerField()
+    scan_date = models.DateField()
+    items = models.JSONField(default=list)  # serialized pantry items, soonest first
+    item_count = models.IntegerField(default=0)
+    earliest_expiry = models.DateField(null=True, blank=True)
+    # ChangeLog watermark at scan time; later pantry changes make the digest stale
+    cursor = models.BigIntegerField(default=0)
+    generated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.item_count} expiring items for {self.user.username}"
+
+class RecipeAlternative(models.Model):
+    # Precomputed swap candidates, refreshed by refresh_recipe_alternatives
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='alternatives')
+    alternative = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='+')
+    rank = models.IntegerField()
+    score = models.FloatField()
+    cost_delta = models.DecimalField(max_digits=8, decimal_places=2)
+
+    class Meta:
+        unique_together = ['recipe', 'alternative']
+        indexes = [
+            models.Index(fields=['recipe', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.alternative.name} instead of {self.recipe.name}"
+
+class RecommendationFeed(models.Model):
+    # Build state of a user's materialized feed, see refresh_recommendation_feeds
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    dirty = models.BooleanField(default=True)  # preferences changed since the last build
+    # ChangeLog watermark at build time; later pantry changes trigger a rebuild
+    cursor = models.BigIntegerField(default=0)
+    # Highest recipe id scored; newer recipes are merged in incrementally
+    recipe_watermark = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Recommendation feed for {self.user.username}"
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    rank = models.IntegerField()
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    cost = models.DecimalField(max_digits=8, decimal_places=2)
+
+    class Meta:
+        # Also the index the feed endpoint pages through
+        unique_together = ['user', 'rank']
+
+    def __str__(self):
+        return f"#{self.rank} {self.recipe.name} for {self.user.username}"
+
+class ArchivedMealPlan(models.Model):
+    # Plans past MEAL_PLAN_RETENTION_DAYS, moved here by gc_meal_plans
+    original_id = models.BigIntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    total_cost = models.DecimalField(max_digits=8, decimal_places=2)
+    # Slots with a snapshot of each recipe, so the recipes themselves can be collected
+    slots = models.JSONField(default=list)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'start_date']),
+        ]
+
+    def __str__(self):
+        return f"Archived Meal Plan for {self.user.username} ({self.start_date} to {self.end_date})"
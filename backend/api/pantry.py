@@ -0,0 +1,194 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .ingredients import normalize_unit
+from .models import Ingredient, UserPantry, RecipeIngredient, MealPlanRecipe
+from .sync import record_changes
+
+MAX_BULK_ITEMS = 500
+
+_quantity_field = UserPantry._meta.get_field('quantity')
+# Largest value UserPantry.quantity can store (9999.99)
+MAX_QUANTITY = Decimal(10) ** (_quantity_field.max_digits - _quantity_field.decimal_places) - (
+    Decimal(1) / Decimal(10) ** _quantity_field.decimal_places
+)
+
+
+def _earliest(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def missing_ingredients(ingredient_ids):
+    """Return the ids in `ingredient_ids` that don't exist, using one query."""
+    ids = set(ingredient_ids)
+    found = set(Ingredient.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    return sorted(ids - found)
+
+
+def upsert_pantry_items(user, items, merge=True):
+    """Create or update pantry rows for many ingredients in one transaction.
+
+    `items` are validated dicts with `ingredient` (id), `quantity` and an
+    optional `expiry_date`. With `merge` the quantity is added to any
+    existing row for the same ingredient (keeping the earliest expiry),
+    otherwise the existing row is overwritten. Raises ValidationError if a
+    merged quantity doesn't fit the quantity column.
+    """
+    # Collapse repeated ingredients in the payload first
+    wanted = {}
+    for item in items:
+        ingredient_id = item['ingredient']
+        if ingredient_id in wanted:
+            current = wanted[ingredient_id]
+            current['quantity'] += item['quantity']
+            current['expiry_date'] = _earliest(current['expiry_date'], item.get('expiry_date'))
+        else:
+            wanted[ingredient_id] = {
+                'quantity': item['quantity'],
+                'expiry_date': item.get('expiry_date'),
+            }
+
+    with transaction.atomic():
+        existing = {}
+        rows = UserPantry.objects.select_for_update().filter(
+            user=user, ingredient_id__in=wanted.keys()
+        ).order_by('id')
+        for row in rows:
+            # Merge into the oldest row when an ingredient already has several
+            existing.setdefault(row.ingredient_id, row)
+
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        for ingredient_id, values in wanted.items():
+            row = existing.get(ingredient_id)
+            if row is None:
+                to_create.append(UserPantry(
+                    user=user,
+                    ingredient_id=ingredient_id,
+                    quantity=values['quantity'],
+                    expiry_date=values['expiry_date']
+                ))
+            elif merge:
+                row.quantity += values['quantity']
+                row.expiry_date = _earliest(row.expiry_date, values['expiry_date'])
+                row.updated_date = now
+                to_update.append(row)
+            else:
+                row.quantity = values['quantity']
+                row.expiry_date = values['expiry_date']
+                row.updated_date = now
+                to_update.append(row)
+
+        too_large = sorted(row.ingredient_id for row in to_create + to_update if row.quantity > MAX_QUANTITY)
+        if too_large:
+            raise ValidationError({
+                'error': f'Merged quantities must not exceed {MAX_QUANTITY}',
+                'ingredients': too_large,
+            })
+
+        created = UserPantry.objects.bulk_create(to_create)
+        if to_update:
+            UserPantry.objects.bulk_update(to_update, ['quantity', 'expiry_date', 'updated_date'])
+
+        changed = created + to_update
+        record_changes((user.pk, 'pantry', row.pk, 'upsert') for row in changed)
+
+    return changed
+
+
+def delete_pantry_items(user, ids):
+    """Delete the user's pantry rows with the given ids in one transaction."""
+    with transaction.atomic():
+        deleted, _ = UserPantry.objects.filter(user=user, pk__in=ids).delete()
+    return deleted
+
+
+def cook_meal_plan_slots(user, meal_plan, slot_id=None, day=None, meal_type=None):
+    """Mark meal plan slots as cooked and deduct their ingredients from the pantry.
+
+    Consumption for all selected slots is aggregated in a single query and
+    taken from the pantry rows expiring first. Rows that run out are
+    removed; shortfalls are reported rather than raised. Pantry quantities
+    are in the ingredient's unit, so recipe amounts in any other unit are
+    reported as missing instead of being deducted.
+    """
+    with transaction.atomic():
+        slots = MealPlanRecipe.objects.select_for_update().filter(
+            meal_plan=meal_plan, cooked_at__isnull=True
+        )
+        if slot_id is not None:
+            slots = slots.filter(pk=slot_id)
+        if day is not None:
+            slots = slots.filter(day=day)
+        if meal_type:
+            slots = slots.filter(meal_type=meal_type)
+        slot_ids = list(slots.values_list('pk', flat=True))
+        if not slot_ids:
+            return {'cooked': [], 'consumed': [], 'missing': []}
+
+        # Joining through the slots counts a recipe once per slot it fills
+        needed = {}
+        units = {}
+        mismatched = []
+        for row in RecipeIngredient.objects.filter(
+            recipe__mealplanrecipe__pk__in=slot_ids
+        ).values('ingredient_id', 'unit', 'ingredient__unit').annotate(total=Sum('quantity')):
+            ingredient_id, pantry_unit = row['ingredient_id'], row['ingredient__unit']
+            if row['unit'] == pantry_unit or normalize_unit(row['unit']) == pantry_unit:
+                needed[ingredient_id] = needed.get(ingredient_id, 0) + row['total']
+                units[ingredient_id] = pantry_unit
+            else:
+                mismatched.append({'ingredient': ingredient_id, 'quantity': row['total'], 'unit': row['unit']})
+
+        rows = UserPantry.objects.select_for_update().filter(
+            user=user, ingredient_id__in=needed.keys()
+        ).order_by(F('expiry_date').asc(nulls_last=True), 'id')
+
+        now = timezone.now()
+        remaining = dict(needed)
+        to_update = []
+        to_delete = []
+        for row in rows:
+            take = min(row.quantity, remaining[row.ingredient_id])
+            if take <= 0:
+                continue
+            remaining[row.ingredient_id] -= take
+            row.quantity -= take
+            if row.quantity <= 0:
+                to_delete.append(row.pk)
+            else:
+                row.updated_date = now
+                to_update.append(row)
+
+        if to_update:
+            UserPantry.objects.bulk_update(to_update, ['quantity', 'updated_date'])
+        if to_delete:
+            # Deletes are logged for sync by the post_delete signal
+            UserPantry.objects.filter(pk__in=to_delete).delete()
+        MealPlanRecipe.objects.filter(pk__in=slot_ids).update(cooked_at=now)
+
+        record_changes(
+            [(user.pk, 'pantry', row.pk, 'upsert') for row in to_update] +
+            [(user.pk, 'meal_plan_recipe', pk, 'upsert') for pk in slot_ids]
+        )
+
+    return {
+        'cooked': slot_ids,
+        'consumed': [
+            {'ingredient': ingredient_id, 'quantity': needed[ingredient_id] - left, 'unit': units[ingredient_id]}
+            for ingredient_id, left in remaining.items()
+            if needed[ingredient_id] - left > 0
+        ],
+        'missing': [
+            {'ingredient': ingredient_id, 'quantity': left, 'unit': units[ingredient_id]}
+            for ingredient_id, left in remaining.items()
+            if left > 0
+        ] + mismatched,
+    }
@@ -0,0 +1,167 @@
+import json
+import re
+from rest_framework import serializers
+from .instrumentation import span
+from .prompts import MEAL_TYPE_CODES, expand_meal_plan, expand_recipe
+
+_FENCE = re.compile(r'```(?:json)?', re.IGNORECASE)
+# Keys a list of recipes or meals may be wrapped under
+WRAPPER_KEYS = {'m', 'meals', 'r', 'recipes'}
+
+
+class LLMOutputError(ValueError):
+    pass
+
+
+def _close_truncated(text, start):
+    """Cut truncated JSON back to its last complete list item and close it.
+
+    Only items of the top-level list, or of a list under one of the wrapper
+    keys at the top of an object, count as complete; a partly written item
+    is dropped rather than closed, so a meal cut off mid-recipe is lost.
+    """
+    stack = []
+    in_string = escaped = False
+    string_start = items_depth = last_key = None
+    last_safe = None
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+                if stack == ['}']:
+                    last_key = text[string_start + 1:index]
+        elif char == '"':
+            in_string = True
+            string_start = index
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+            if items_depth is None and char == '[':
+                if len(stack) == 1 or (len(stack) == 2 and stack[0] == '}' and last_key in WRAPPER_KEYS):
+                    items_depth = len(stack)
+        elif char in '}]':
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return text[start:index + 1]
+            if len(stack) == items_depth:
+                # An item of the list just closed; everything up to here is complete
+                last_safe = (index + 1, list(stack))
+    if last_safe is None:
+        raise LLMOutputError('No complete JSON value in model output')
+    end, open_containers = last_safe
+    return text[start:end] + ''.join(reversed(open_containers))
+
+
+def extract_json(text):
+    """Pull the first JSON value out of model output.
+
+    Prose around the JSON and code fences are ignored. Truncated output is
+    cut back to the last complete list item, so complete items survive.
+    """
+    with span('parse'):
+        text = _FENCE.sub('', text or '')
+        starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+        if not starts:
+            raise LLMOutputError('No JSON found in model output')
+        start = min(starts)
+        try:
+            value, _ = json.JSONDecoder().raw_decode(text, start)
+            return value
+        except json.JSONDecodeError:
+            pass
+        try:
+            return json.loads(_close_truncated(text, start))
+        except json.JSONDecodeError as e:
+            raise LLMOutputError(f'Could not repair model output: {e}')
+
+
+class TextOrLinesField(serializers.CharField):
+    """Accept a string or a list of steps, which models often return instead."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            data = '\n'.join(str(step) for step in data)
+        return super().to_internal_value(data)
+
+
+class LLMIngredientSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+    quantity = serializers.FloatField(min_value=0, max_value=9999)
+    unit = serializers.CharField(max_length=20, required=False, allow_null=True, default='pieces')
+
+    def validate(self, data):
+        data['quantity'] = round(data['quantity'], 2)
+        data['unit'] = data.get('unit') or 'pieces'
+        return data
+
+
+class LLMRecipeSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=200)
+    description = TextOrLinesField(required=False, allow_blank=True, default='')
+    instructions = TextOrLinesField(required=False, allow_blank=True, default='')
+    prep_time = serializers.IntegerField(required=False, allow_null=True, min_value=0)
+    cook_time = serializers.IntegerField(required=False, allow_null=True, min_value=0)
+    servings = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    estimated_cost = serializers.FloatField(required=False, allow_null=True)
+    ingredients = LLMIngredientSerializer(many=True, allow_empty=False)
+
+
+class LLMMealSerializer(serializers.Serializer):
+    day = serializers.IntegerField(min_value=1)
+    meal_type = serializers.CharField(max_length=20)
+    recipe = LLMRecipeSerializer()
+
+    def validate_meal_type(self, value):
+        value = value.strip().lower()
+        return MEAL_TYPE_CODES.get(value, value)
+
+
+def _valid_items(items, serializer_class):
+    valid = []
+    errors = []
+    with span('parse'):
+        for item in items:
+            serializer = serializer_class(data=item)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                errors.append(serializer.errors)
+    return valid, errors
+
+
+def parse_recipes(text):
+    """Return (recipes, errors) with every valid recipe in the model output."""
+    value = extract_json(text)
+    if isinstance(value, dict):
+        value = value.get('r') or value.get('recipes') or [value]
+    if not isinstance(value, list):
+        raise LLMOutputError('Expected a list of recipes')
+    items = [expand_recipe(item) for item in value if isinstance(item, dict)]
+    return _valid_items(items, LLMRecipeSerializer)
+
+
+def parse_meals(text):
+    """Return (meals, errors) with every valid meal in a meal plan response."""
+    value = extract_json(text)
+    if isinstance(value, list):
+        verbose = value and isinstance(value[0], dict) and 'recipe' in value[0]
+        value = {'meals': value} if verbose else {'m': value}
+    if not isinstance(value, dict):
+        raise LLMOutputError('Expected a meal plan object')
+    try:
+        meals = expand_meal_plan(value)['meals']
+    except (KeyError, TypeError, AttributeError):
+        # Expand meal by meal so one malformed entry doesn't lose the rest
+        meals = []
+        for meal in value.get('m', []):
+            try:
+                meals.extend(expand_meal_plan({'m': [meal]})['meals'])
+            except (KeyError, TypeError, AttributeError):
+                continue
+    return _valid_items(meals, LLMMealSerializer)
@@ -0,0 +1,171 @@
+import csv
+import gzip
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from .alternatives import refresh_alternatives
+from .costs import recompute_plan_costs, plans_using_ingredients
+from .ingredients import (
+    bump_index_version, canonical_name, get_index,
+    normalize_name, normalize_unit, normalize_category
+)
+from .models import Ingredient, RecipeIngredient
+
+MAX_PRICE = Decimal('9999.99')  # Ingredient.cost_per_unit is max_digits=6
+
+
+def open_price_file(path):
+    if str(path).endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path), encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_price_rows(handle, file_format):
+    """Yield raw row dicts from a CSV or JSON lines file, one line at a time.
+
+    Lines that aren't valid JSON yield None, so one bad line is skipped
+    rather than aborting an import whose earlier batches are committed.
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(handle)
+    else:
+        for line in handle:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+
+
+def price_file_format(path):
+    """Guess csv or jsonl from the file name, ignoring a trailing .gz."""
+    name = str(path).lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return 'csv' if name.endswith('.csv') else 'jsonl'
+
+
+def parse_price_row(row):
+    """Return a normalized (name, cost, unit, category) tuple, or None if unusable."""
+    if not isinstance(row, dict):
+        return None
+    name = normalize_name(row.get('name') or '')
+    if not name or len(name) > 100:
+        return None
+    try:
+        cost = Decimal(str(row.get('cost_per_unit', row.get('price', ''))).strip().lstrip('$'))
+    except InvalidOperation:
+        return None
+    if not cost.is_finite() or cost < 0 or cost > MAX_PRICE:
+        return None
+    unit = normalize_unit(row.get('unit'))
+    if row.get('unit') and unit is None:
+        return None
+    return name, cost.quantize(Decimal('0.01')), unit, normalize_category(row.get('category'))
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class PriceImporter:
+    """Stream price rows into Ingredient with batched upserts.
+
+    Memory use is bounded by the batch size plus one name and id per
+    ingredient (to match names and to know what to recompute).
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.read = 0
+        self.skipped = 0
+        self.malformed = 0
+        self.unit_mismatches = 0
+        self.upserted = 0
+        self.ingredient_ids = set()
+        self.index = get_index()
+        self.new_names = {}
+
+    def _stored_name(self, name):
+        # Match existing ingredients by canonical name, so "Tomatoes" rows
+        # update the stored "Tomato" rather than creating a duplicate
+        entry = self.index.lookup(name)
+        if entry is not None:
+            return entry[1]
+        canonical = canonical_name(name)[:100]
+        return self.new_names.setdefault(canonical, canonical)
+
+    def run(self, rows):
+        for batch in batched(rows, self.batch_size):
+            self._import_batch(batch)
+
+    def _import_batch(self, batch):
+        parsed = {}
+        for row in batch:
+            self.read += 1
+            if row is None:
+                self.malformed += 1
+            values = parse_price_row(row)
+            if values is None:
+                self.skipped += 1
+                continue
+            name = self._stored_name(values[0])
+            # Later rows for the same ingredient win
+            parsed[name] = values
+
+        # Prices are per the ingredient's stored unit, which pantry and recipe
+        # quantities depend on; rows quoting another unit are skipped
+        stored_units = dict(Ingredient.objects.filter(name__in=list(parsed)).values_list('name', 'unit'))
+        for name, (_, _, unit, _) in list(parsed.items()):
+            if unit and name in stored_units and unit != stored_units[name]:
+                del parsed[name]
+                self.skipped += 1
+                self.unit_mismatches += 1
+
+        # Existing ingredients only get a new price; unit and category are
+        # taken from the file for new ones
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(
+                        name=name,
+                        cost_per_unit=cost,
+                        unit=unit or 'pieces',
+                        category=category or 'other'
+                    )
+                    for name, (_, cost, unit, category) in parsed.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['name'],
+                update_fields=['cost_per_unit']
+            )
+        self.upserted += len(parsed)
+        self.ingredient_ids.update(
+            Ingredient.objects.filter(name__in=list(parsed)).values_list('id', flat=True)
+        )
+
+    def finish(self):
+        if self.new_names:
+            bump_index_version()
+
+    def recompute_costs(self):
+        """Recompute plan totals and swap candidates touched by the import, once."""
+        ingredient_ids = sorted(self.ingredient_ids)
+        plans = recompute_plan_costs(sorted(plans_using_ingredients(ingredient_ids)))
+
+        recipe_ids = set()
+        for batch in batched(ingredient_ids, 500):
+            recipe_ids.update(RecipeIngredient.objects.filter(
+                ingredient_id__in=batch
+            ).values_list('recipe_id', flat=True).distinct())
+        recipes = refresh_alternatives(sorted(recipe_ids)) if recipe_ids else 0
+        return plans, recipes
@@ -0,0 +1,188 @@
+from django.conf import settings
+from .llm import count_tokens
+
+MEAL_TYPE_CODES = {'b': 'breakfast', 'l': 'lunch', 'd': 'dinner', 's': 'snack'}
+MEAL_TYPE_LETTERS = {name: code for code, name in MEAL_TYPE_CODES.items()}
+
+# Short keys keep completions small; expand_recipe maps them back
+RECIPE_SCHEMA = (
+    '{"n":name,"d":short description,"p":prep minutes,"c":cook minutes,'
+    '"v":servings,"$":estimated total cost,"i":[[ingredient,quantity,unit]],'
+    '"s":instructions as one string}'
+)
+
+
+def _fit(parts, budget, separator='; '):
+    """Join as many leading `parts` as fit in `budget` tokens."""
+    kept = []
+    used = 0
+    for part in parts:
+        cost = count_tokens(part + separator)
+        if used + cost > budget:
+            break
+        kept.append(part)
+        used += cost
+    omitted = len(parts) - len(kept)
+    text = separator.join(kept)
+    if omitted:
+        text += f' (+{omitted} more)'
+    return text
+
+
+def compact_pantry(pantry_items, budget=None):
+    """Describe pantry rows in as few tokens as possible.
+
+    Items expiring soonest come first, then larger quantities, so the
+    ones worth using survive truncation to the token budget.
+    """
+    budget = budget or settings.LLM_PANTRY_TOKEN_BUDGET
+    ranked = sorted(
+        pantry_items,
+        key=lambda item: (item.expiry_date is None, item.expiry_date or 0, -item.quantity)
+    )
+    parts = []
+    for item in ranked:
+        part = f'{item.ingredient.name} {item.quantity.normalize():f} {item.ingredient.unit}'
+        if item.expiry_date:
+            part += f' exp {item.expiry_date:%m-%d}'
+        parts.append(part)
+    return _fit(parts, budget)
+
+
+def compact_names(names, budget=None):
+    return _fit(list(names), budget or settings.LLM_DISLIKED_TOKEN_BUDGET, ', ')
+
+
+def preference_lines(preferences):
+    lines = [
+        f'Diet: {preferences.dietary_restrictions}',
+        f'Cuisine: {preferences.preferred_cuisines}',
+    ]
+    disliked = compact_names(ing.name for ing in preferences.disliked_ingredients.all())
+    if disliked:
+        lines.append(f'Avoid: {disliked}')
+    return lines
+
+
+def suggest_prompt(pantry_items, preferences):
+    lines = [
+        'Suggest 3 recipes.',
+        *preference_lines(preferences),
+        f'Budget: about ${preferences.weekly_budget / 7:.2f} per meal',
+    ]
+    pantry = compact_pantry(pantry_items)
+    if pantry:
+        lines.append(f'Use pantry (soonest expiry first): {pantry}')
+    lines.append(f'Reply with only a JSON array of recipes, each {RECIPE_SCHEMA}.')
+    return '\n'.join(lines)
+
+
+def variations_prompt(recipe, count):
+    ingredients = '; '.join(
+        f'{ri.ingredient.name} {ri.quantity.normalize():f} {ri.unit}'
+        for ri in recipe.recipeingredient_set.all()
+    )
+    lines = [
+        f'Create {count} variations of this recipe, changing some ingredients or techniques '
+        'but keeping a similar structure, cooking time, difficulty and servings.',
+        f'Name: {recipe.name}',
+        f'Description: {recipe.description}',
+        f'Ingredients: {ingredients}',
+        f'Instructions: {recipe.instructions}',
+        f'Reply with only a JSON array of recipes, each {RECIPE_SCHEMA}.',
+    ]
+    return '\n'.join(lines)
+
+
+def meal_types(meals_per_day):
+    """Meal types expected each day for a given number of meals.
+
+    Each type appears at most once a day, so anything above four meals
+    gets the same four types.
+    """
+    base = {1: ['dinner'], 2: ['lunch', 'dinner']}.get(meals_per_day, ['breakfast', 'lunch', 'dinner'])
+    return base + ['snack'] if meals_per_day > 3 else base
+
+
+def meal_plan_prompt(days, meals_per_day, preferences, pantry_items, day=None, palette=None):
+    """Prompt for a whole plan, or for a single `day` of it when fanning out."""
+    letters = ','.join(MEAL_TYPE_LETTERS[meal_type] for meal_type in meal_types(meals_per_day))
+    if day is None:
+        lines = [
+            f'Create a {days}-day meal plan with {meals_per_day} meals per day ({letters}).',
+            f'Budget: ${preferences.weekly_budget} in total. Reuse ingredients across meals to minimize waste.',
+        ]
+    else:
+        lines = [
+            f'Create day {day} of a {days}-day meal plan: {meals_per_day} meals ({letters}), all with "d":{day}.',
+            f'Budget: ${preferences.weekly_budget / days:.2f} for the day. Reuse ingredients across meals to minimize waste.',
+        ]
+    lines.extend(preference_lines(preferences))
+    if palette:
+        lines.append(f'Build meals mainly from these shared ingredients: {", ".join(palette)}')
+    pantry = compact_pantry(pantry_items)
+    if pantry:
+        lines.append(f'Use pantry (soonest expiry first): {pantry}')
+    lines.append(
+        'Reply with only JSON: {"m":[{"d":day number,"t":meal type as b/l/d/s,"r":recipe}]} '
+        f'where recipe is {RECIPE_SCHEMA}.'
+    )
+    return '\n'.join(lines)
+
+
+def palette_prompt(days, preferences, pantry_items, size):
+    lines = [
+        f'List {size} versatile ingredients to share across a {days}-day meal plan.',
+        *preference_lines(preferences),
+    ]
+    pantry = compact_pantry(pantry_items)
+    if pantry:
+        lines.append(f'Prefer pantry items: {pantry}')
+    lines.append('Reply with only a JSON array of ingredient names.')
+    return '\n'.join(lines)
+
+
+def missing_meals_prompt(plan_prompt, missing):
+    """Ask again for only the (day, meal_type) slots absent from an earlier reply."""
+    slots = ', '.join(f'day {day} {MEAL_TYPE_LETTERS.get(meal_type, meal_type)}' for day, meal_type in missing)
+    return f'{plan_prompt}\nOnly return these meals: {slots}.'
+
+
+def expand_recipe(data):
+    """Map a compact recipe onto the verbose field names used by the API."""
+    if 'n' not in data:
+        return data  # the model ignored the compact schema
+    ingredients = []
+    for entry in data.get('i', []):
+        if isinstance(entry, dict):
+            ingredients.append(entry)
+        else:
+            # A bare "salt" is one name, not a sequence of characters
+            fields = list(entry) if isinstance(entry, (list, tuple)) else [entry]
+            name, quantity, unit = (fields + [None, None, None])[:3]
+            ingredients.append({'name': name, 'quantity': quantity, 'unit': unit or 'pieces'})
+    return {
+        'name': data['n'],
+        'description': data.get('d', ''),
+        'prep_time': data.get('p'),
+        'cook_time': data.get('c'),
+        'servings': data.get('v'),
+        'estimated_cost': data.get('$'),
+        'ingredients': ingredients,
+        'instructions': data.get('s', ''),
+    }
+
+
+def expand_meal_plan(data):
+    if 'meals' in data:
+        return data
+    return {
+        'meals': [
+            {
+                'day': meal['d'],
+                'meal_type': MEAL_TYPE_CODES.get(meal['t'], meal['t']),
+                'recipe': expand_recipe(meal['r']),
+            }
+            for meal in data.get('m', [])
+        ]
+    }
@@ -0,0 +1,149 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import (
+    ArchivedMealPlan, MealPlan, MealPlanRecipe,
+    Recipe, RecipeIngredient
+)
+from .sync import record_changes
+
+
+def _recipe_snapshots(recipe_ids):
+    recipes = {
+        recipe['id']: dict(recipe, ingredients=[])
+        for recipe in Recipe.objects.filter(pk__in=recipe_ids).values(
+            'id', 'name', 'description', 'instructions', 'prep_time', 'cook_time', 'servings'
+        )
+    }
+    rows = RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).values_list(
+        'recipe_id', 'ingredient__name', 'quantity', 'unit'
+    )
+    for recipe_id, name, quantity, unit in rows:
+        recipes[recipe_id]['ingredients'].append({'name': name, 'quantity': str(quantity), 'unit': unit})
+    return recipes
+
+
+def _delete_rows(model, field, values):
+    """Delete rows of `model` whose `field` is in `values` with one DELETE.
+
+    Plain SQL runs no delete signals and no ORM cascades, so callers must
+    only use it on tables nothing else references and log what the
+    signals would have. Returns the number of rows deleted.
+    """
+    if not values:
+        return 0
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(model._meta.get_field(field).column)} IN ({placeholders})',
+            list(values)
+        )
+        return cursor.rowcount
+
+
+def archive_old_plans(retention_days=None, batch_size=200, pause=0.0):
+    """Move plans that ended more than `retention_days` ago into ArchivedMealPlan.
+
+    Works in short transactions of `batch_size` plans, sleeping `pause`
+    seconds in between so writers aren't blocked for long. Returns
+    (plans archived, slots archived).
+    """
+    if retention_days is None:
+        retention_days = settings.MEAL_PLAN_RETENTION_DAYS
+    cutoff = timezone.localdate() - timedelta(days=retention_days)
+    old_plans = MealPlan.objects.filter(end_date__lt=cutoff).order_by('id')
+
+    plans_archived = slots_archived = 0
+    while True:
+        with transaction.atomic():
+            plans = list(old_plans[:batch_size])
+            if not plans:
+                break
+            plan_ids = [plan.pk for plan in plans]
+            slots = list(MealPlanRecipe.objects.filter(meal_plan_id__in=plan_ids).order_by('day', 'id'))
+            recipes = _recipe_snapshots({slot.recipe_id for slot in slots})
+
+            by_plan = {}
+            for slot in slots:
+                by_plan.setdefault(slot.meal_plan_id, []).append({
+                    'day': slot.day,
+                    'meal_type': slot.meal_type,
+                    'cooked_at': slot.cooked_at.isoformat() if slot.cooked_at else None,
+                    'recipe': recipes.get(slot.recipe_id),
+                })
+            ArchivedMealPlan.objects.bulk_create([
+                ArchivedMealPlan(
+                    original_id=plan.pk,
+                    user_id=plan.user_id,
+                    start_date=plan.start_date,
+                    end_date=plan.end_date,
+                    total_cost=plan.total_cost,
+                    slots=by_plan.get(plan.pk, []),
+                    created_at=plan.created_at
+                )
+                for plan in plans
+            ])
+
+            # Deletes are logged in bulk for sync clients. The per-row delete
+            # signals would log them one query at a time and recompute the
+            # cost of plans that are going away; nothing references slots,
+            # and plans only through the slots deleted first
+            owners = {plan.pk: plan.user_id for plan in plans}
+            record_changes(
+                [(owners[slot.meal_plan_id], 'meal_plan_recipe', slot.pk, 'delete') for slot in slots]
+                + [(plan.user_id, 'meal_plan', plan.pk, 'delete') for plan in plans]
+            )
+            _delete_rows(MealPlanRecipe, 'meal_plan', plan_ids)
+            _delete_rows(MealPlan, 'id', plan_ids)
+
+        plans_archived += len(plans)
+        slots_archived += len(slots)
+        if pause:
+            time.sleep(pause)
+    return plans_archived, slots_archived
+
+
+def orphaned_recipes():
+    """Generated recipes no meal plan refers to any more."""
+    return Recipe.objects.filter(is_generated=True).filter(
+        ~Exists(MealPlanRecipe.objects.filter(recipe_id=OuterRef('pk')))
+    )
+
+
+def collect_orphaned_recipes(batch_size=500, pause=0.0):
+    """Delete generated recipes that no plan uses, `batch_size` at a time.
+
+    Recipes created or edited through the API are never collected.
+    Returns {model label: rows deleted}, including cascades.
+    """
+    reclaimed = {}
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                orphaned_recipes().filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            # Lock the rows, then re-check: a generate reusing one of these holds
+            # its lock until its slot is committed, which the re-check then sees
+            locked = list(
+                Recipe.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', flat=True)
+            )
+            doomed = list(orphaned_recipes().filter(pk__in=locked).values_list('pk', flat=True))
+            # Skips the per-row cost and fingerprint signals: no plan uses these
+            # recipes and they are deleted next; nothing references the rows
+            count = _delete_rows(RecipeIngredient, 'recipe', doomed)
+            reclaimed[RecipeIngredient._meta.label] = reclaimed.get(RecipeIngredient._meta.label, 0) + count
+            _, deleted = Recipe.objects.filter(pk__in=doomed).delete()
+        for label, count in deleted.items():
+            reclaimed[label] = reclaimed.get(label, 0) + count
+        if pause:
+            time.sleep(pause)
+    return reclaimed
@@ -5,8 +5,90 @@ from .models import (
     UserPreference, MealPlan, MealPlanRecipe,
     UserPantry
 )
-
-class UserSerializer(serializers.ModelSerializer):
+from .instrumentation import TimedSerializerMixin
+
+
+def field_spec(fields=None, expand=None):
+    """Parse `fields`/`expand` query values into a nested selection.
+
+    Returns None (everything) when no `fields` are given, else a dict of
+    field name to sub-selection, where None selects the whole field.
+    Dotted names reach into nested serializers: `recipes.recipe.name`.
+    `expand` names relations to include in full on top of `fields`.
+    """
+    if not fields:
+        return None
+    spec = {}
+    paths = [(path, False) for path in fields.split(',')]
+    paths += [(path, True) for path in (expand or '').split(',')]
+    for path, whole in paths:
+        parts = [part for part in path.strip().split('.') if part]
+        node = spec
+        for i, part in enumerate(parts):
+            last = i == len(parts) - 1
+            if part in node and node[part] is None:
+                break  # already selected in full
+            if last:
+                node[part] = None if whole or part not in node else node[part]
+            else:
+                node = node.setdefault(part, {})
+    return spec
+
+
+def request_field_spec(request):
+    if request is None or request.method != 'GET':
+        return None
+    return field_spec(request.query_params.get('fields'), request.query_params.get('expand'))
+
+
+def is_requested(spec, *path):
+    """Whether the field at `path` will be serialized, so views only prefetch what's used."""
+    node = spec
+    for part in path:
+        if node is None:
+            return True
+        if part not in node:
+            return False
+        node = node[part]
+    return True
+
+
+class DynamicFieldsMixin:
+    """Serialize only the fields selected by `?fields=` and `?expand=` on GET requests.
+
+    The selection is read from the request by the top-level serializer and
+    handed down to nested dynamic serializers, so unselected relations are
+    never serialized.
+    """
+    _UNSET = object()
+
+    def __init__(self, *args, **kwargs):
+        self._field_spec = self._UNSET
+        super().__init__(*args, **kwargs)
+
+    def get_field_spec(self):
+        if self._field_spec is self._UNSET:
+            root = self.root
+            is_top = root is self or (self.parent is root and isinstance(root, serializers.ListSerializer))
+            self._field_spec = request_field_spec(self.context.get('request')) if is_top else None
+        return self._field_spec
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self.get_field_spec()
+        if spec is None:
+            return fields
+        selected = {}
+        for name, field in fields.items():
+            if name not in spec:
+                continue
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(nested, DynamicFieldsMixin):
+                nested._field_spec = spec[name]
+            selected[name] = field
+        return selected
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
@@ -29,19 +111,19 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(DynamicFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ['id', 'name', 'cost_per_unit', 'unit', 'category']
 
-class RecipeIngredientSerializer(serializers.ModelSerializer):
+class RecipeIngredientSerializer(DynamicFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     ingredient = IngredientSerializer()
 
     class Meta:
         model = RecipeIngredient
         fields = ['ingredient', 'quantity', 'unit']
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(DynamicFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(source='recipeingredient_set', many=True)
 
     class Meta:
@@ -51,7 +133,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'prep_time', 'cook_time', 'servings', 'ingredients'
         ]
 
-class UserPreferenceSerializer(serializers.ModelSerializer):
+class UserPreferenceSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = UserPreference
         fields = [
@@ -59,14 +141,14 @@ class UserPreferenceSerializer(serializers.ModelSerializer):
             'preferred_cuisines', 'disliked_ingredients'
         ]
 
-class MealPlanRecipeSerializer(serializers.ModelSerializer):
+class MealPlanRecipeSerializer(DynamicFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     recipe = RecipeSerializer()
 
     class Meta:
         model = MealPlanRecipe
-        fields = ['recipe', 'day', 'meal_type']
+        fields = ['id', 'recipe', 'day', 'meal_type', 'cooked_at']
 
-class MealPlanSerializer(serializers.ModelSerializer):
+class MealPlanSerializer(DynamicFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     recipes = MealPlanRecipeSerializer(source='mealplanrecipe_set', many=True)
 
     class Meta:
@@ -76,7 +158,7 @@ class MealPlanSerializer(serializers.ModelSerializer):
             'total_cost', 'recipes'
         ]
 
-class UserPantrySerializer(serializers.ModelSerializer):
+class UserPantrySerializer(DynamicFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     ingredient = IngredientSerializer()
 
     class Meta:
@@ -86,4 +168,76 @@ class UserPantrySerializer(serializers.ModelSerializer):
 class UserPantryCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserPantry
-        fields = ['ingredient', 'quantity', 'expiry_date'] 
\ No newline at end of file
+        fields = ['id', 'ingredient', 'quantity', 'expiry_date']
+
+class MealPlanSyncSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = MealPlan
+        fields = [
+            'id', 'start_date', 'end_date',
+            'total_cost', 'updated_at'
+        ]
+
+class MealPlanRecipeSyncSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    recipe = RecipeSerializer()
+
+    class Meta:
+        model = MealPlanRecipe
+        fields = ['id', 'meal_plan', 'recipe', 'day', 'meal_type', 'cooked_at']
+
+class UserPantryBulkItemSerializer(serializers.Serializer):
+    # A plain id: ingredients are checked in a single query by the view
+    # instead of one lookup per row by PrimaryKeyRelatedField
+    ingredient = serializers.IntegerField()
+    quantity = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0)
+    expiry_date = serializers.DateField(required=False, allow_null=True)
+
+class UserPantryBulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1))
+
+class NormalizedMealPlanRecipeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MealPlanRecipe
+        fields = ['id', 'recipe', 'day', 'meal_type', 'cooked_at']
+
+class NormalizedMealPlanSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    slots = NormalizedMealPlanRecipeSerializer(source='mealplanrecipe_set', many=True)
+
+    class Meta:
+        model = MealPlan
+        fields = ['id', 'start_date', 'end_date', 'total_cost', 'slots']
+
+class NormalizedRecipeIngredientSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecipeIngredient
+        fields = ['ingredient', 'quantity', 'unit']
+
+class NormalizedRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    ingredients = NormalizedRecipeIngredientSerializer(source='recipeingredient_set', many=True)
+
+    class Meta:
+        model = Recipe
+        fields = [
+            'id', 'name', 'description', 'instructions',
+            'prep_time', 'cook_time', 'servings', 'ingredients'
+        ]
+
+
+def normalized_meal_plans(meal_plans):
+    """Serialize plans with recipes and ingredients listed once, referenced by id.
+
+    Expects plans prefetched down to mealplanrecipe_set__recipe__recipeingredient_set__ingredient.
+    Returns (plans, recipes, ingredients).
+    """
+    recipes = {}
+    ingredients = {}
+    for meal_plan in meal_plans:
+        for slot in meal_plan.mealplanrecipe_set.all():
+            recipes[slot.recipe.pk] = slot.recipe
+            for recipe_ingredient in slot.recipe.recipeingredient_set.all():
+                ingredients[recipe_ingredient.ingredient.pk] = recipe_ingredient.ingredient
+    return (
+        NormalizedMealPlanSerializer(meal_plans, many=True).data,
+        NormalizedRecipeSerializer(sorted(recipes.values(), key=lambda r: r.pk), many=True).data,
+        IngredientSerializer(sorted(ingredients.values(), key=lambda i: i.pk), many=True).data,
+    )
@@ -0,0 +1,159 @@
+import threading
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_token
+from .costs import recompute_costs_for_ingredients, recompute_costs_for_recipes, recompute_plan_costs
+from .feed import mark_feeds_dirty
+from .fingerprints import refresh_fingerprints
+from .ingredients import bump_index_version, index_added
+from .models import (
+    Ingredient, Recipe, RecipeIngredient, UserPantry, UserPreference,
+    MealPlan, MealPlanRecipe
+)
+from .sync import record_change
+
+_pending = threading.local()
+
+
+def run_on_commit(name, ids, handler):
+    """Queue `ids` and call handler(ids) once the current transaction commits.
+
+    Ids queued by many rows of one transaction are handled in a single
+    call; outside a transaction the handler runs straight away. A rollback
+    discards the queue along with its callback.
+    """
+    pending = getattr(_pending, name, None)
+    connection = transaction.get_connection()
+    # A flush that is no longer among the connection's callbacks was thrown
+    # away by a rollback, so its ids must not leak into this transaction
+    if pending is None or not any(func is pending[1] for _, func, _ in connection.run_on_commit):
+        batch = set(ids)
+
+        def flush():
+            if getattr(_pending, name, None) is pending:
+                setattr(_pending, name, None)
+            handler(sorted(batch))
+
+        pending = (batch, flush)
+        setattr(_pending, name, pending)
+        transaction.on_commit(flush)
+    else:
+        pending[0].update(ids)
+
+
+@receiver(post_save, sender=UserPantry)
+def log_pantry_save(sender, instance, **kwargs):
+    record_change(instance.user_id, 'pantry', instance.pk)
+
+
+@receiver(post_delete, sender=UserPantry)
+def log_pantry_delete(sender, instance, **kwargs):
+    record_change(instance.user_id, 'pantry', instance.pk, 'delete')
+
+
+@receiver(post_save, sender=MealPlan)
+def log_meal_plan_save(sender, instance, **kwargs):
+    record_change(instance.user_id, 'meal_plan', instance.pk)
+
+
+@receiver(post_delete, sender=MealPlan)
+def log_meal_plan_delete(sender, instance, **kwargs):
+    record_change(instance.user_id, 'meal_plan', instance.pk, 'delete')
+
+
+@receiver(post_save, sender=MealPlanRecipe)
+def log_meal_plan_recipe_save(sender, instance, **kwargs):
+    record_change(instance.meal_plan.user_id, 'meal_plan_recipe', instance.pk)
+
+
+@receiver(pre_delete, sender=MealPlanRecipe)
+def log_meal_plan_recipe_delete(sender, instance, **kwargs):
+    # Look the owner up before the row (and possibly its plan) is removed
+    user_id = MealPlan.objects.filter(pk=instance.meal_plan_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        record_change(user_id, 'meal_plan_recipe', instance.pk, 'delete')
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    # Cached tokens carry the user, so password or is_active changes must drop them
+    if not created:
+        for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+            invalidate_token(key)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def update_costs_for_recipe(sender, instance, **kwargs):
+    run_on_commit('recipe_costs', [instance.recipe_id], recompute_costs_for_recipes)
+    # Stale fingerprints would let generates reuse, and compaction merge, recipes that now differ
+    run_on_commit('fingerprints', [instance.recipe_id], refresh_fingerprints)
+
+
+@receiver(post_save, sender=MealPlanRecipe)
+def update_cost_for_saved_slot(sender, instance, created, update_fields=None, **kwargs):
+    # Marking a slot cooked doesn't change what the plan costs
+    if created or update_fields is None or 'recipe' in update_fields:
+        run_on_commit('plan_costs', [instance.meal_plan_id], recompute_plan_costs)
+
+
+@receiver(post_delete, sender=MealPlanRecipe)
+def update_cost_for_deleted_slot(sender, instance, **kwargs):
+    run_on_commit('plan_costs', [instance.meal_plan_id], recompute_plan_costs)
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_renamed_fingerprint(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'name' in update_fields):
+        run_on_commit('fingerprints', [instance.pk], refresh_fingerprints)
+
+
+@receiver(pre_save, sender=Ingredient)
+def detect_ingredient_change(sender, instance, **kwargs):
+    instance._price_changed = False
+    instance._name_changed = False
+    if instance.pk is not None and not instance._state.adding:
+        old = Ingredient.objects.filter(pk=instance.pk).values_list('cost_per_unit', 'name').first()
+        if old is not None:
+            instance._price_changed = old[0] != instance.cost_per_unit
+            instance._name_changed = old[1] != instance.name
+
+
+@receiver(post_save, sender=Ingredient)
+def update_for_ingredient(sender, instance, created, **kwargs):
+    if created:
+        index_added(instance.pk, instance.name)
+    elif getattr(instance, '_name_changed', False):
+        bump_index_version()
+    if getattr(instance, '_price_changed', False):
+        run_on_commit('ingredient_costs', [instance.pk], recompute_costs_for_ingredients)
+
+
+@receiver(post_delete, sender=Ingredient)
+def drop_from_ingredient_index(sender, instance, **kwargs):
+    bump_index_version()
+
+
+@receiver(post_save, sender=UserPreference)
+def rebuild_feed_on_preferences(sender, instance, **kwargs):
+    mark_feeds_dirty([instance.user_id])
+
+
+@receiver(m2m_changed, sender=UserPreference.disliked_ingredients.through)
+def rebuild_feed_on_dislikes(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # Changed from the ingredient side; pk_set holds preference ids
+        user_ids = UserPreference.objects.filter(pk__in=pk_set or ()).values_list('user_id', flat=True)
+        mark_feeds_dirty(list(user_ids))
+    else:
+        mark_feeds_dirty([instance.user_id])
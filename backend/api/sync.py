@@ -0,0 +1,158 @@
+from .models import ChangeLog, UserPantry, MealPlan, MealPlanRecipe
+from .serializers import (
+    UserPantrySerializer, MealPlanSyncSerializer,
+    MealPlanRecipeSyncSerializer
+)
+
+# Section names in the sync payload, keyed by ChangeLog entity
+SECTIONS = {
+    'pantry': 'pantry',
+    'meal_plan': 'meal_plans',
+    'meal_plan_recipe': 'meal_plan_recipes',
+}
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+
+def record_change(user_id, entity, object_id, action='upsert'):
+    ChangeLog.objects.create(
+        user_id=user_id,
+        entity=entity,
+        object_id=object_id,
+        action=action
+    )
+
+
+def record_changes(changes):
+    """Bulk-record (user_id, entity, object_id, action) tuples.
+
+    Bulk writes (bulk_create, bulk_update, queryset.update) skip model
+    signals, so code using them must log its changes through here.
+    """
+    ChangeLog.objects.bulk_create([
+        ChangeLog(user_id=user_id, entity=entity, object_id=object_id, action=action)
+        for user_id, entity, object_id, action in changes
+    ])
+
+
+def latest_cursor(user):
+    last = ChangeLog.objects.filter(user=user).order_by('-id').values_list('id', flat=True).first()
+    return last or 0
+
+
+def _pantry_queryset(user):
+    return UserPantry.objects.filter(user=user).select_related('ingredient')
+
+
+def _meal_plan_queryset(user):
+    return MealPlan.objects.filter(user=user)
+
+
+def _meal_plan_recipe_queryset(user):
+    return MealPlanRecipe.objects.filter(meal_plan__user=user).select_related(
+        'recipe'
+    ).prefetch_related('recipe__recipeingredient_set__ingredient')
+
+
+QUERYSETS = {
+    'pantry': (_pantry_queryset, UserPantrySerializer),
+    'meal_plan': (_meal_plan_queryset, MealPlanSyncSerializer),
+    'meal_plan_recipe': (_meal_plan_recipe_queryset, MealPlanRecipeSyncSerializer),
+}
+
+
+def _empty_payload(cursor):
+    payload = {
+        'cursor': cursor,
+        'has_more': False,
+        'full': False,
+        'deleted': {},
+    }
+    for section in SECTIONS.values():
+        payload[section] = []
+        payload['deleted'][section] = []
+    return payload
+
+
+def parse_snapshot_token(token):
+    """Split a `next` token into (cursor, entity, last primary key)."""
+    cursor, entity, last_pk = token.split('.')
+    if entity not in QUERYSETS:
+        raise ValueError(f'Unknown entity {entity}')
+    return int(cursor), entity, int(last_pk)
+
+
+def full_snapshot(user, limit=DEFAULT_LIMIT, after=None):
+    """Return one page of the user's pantry and meal plan rows.
+
+    Pages hold at most `limit` rows across all sections; `after` is the
+    `next` token of the previous page. The watermark is read on the first
+    page and carried in the tokens, so anything written while paging is
+    replayed on the next delta; upserts are idempotent on the client.
+    """
+    if after:
+        cursor, entity, last_pk = parse_snapshot_token(after)
+    else:
+        cursor, entity, last_pk = latest_cursor(user), next(iter(QUERYSETS)), 0
+    payload = _empty_payload(cursor)
+    payload['full'] = True
+    payload['next'] = None
+
+    entities = list(QUERYSETS)
+    remaining = limit
+    for entity in entities[entities.index(entity):]:
+        if not remaining:
+            payload['has_more'] = True
+            payload['next'] = f'{cursor}.{entity}.0'
+            break
+        get_queryset, serializer_class = QUERYSETS[entity]
+        rows = list(get_queryset(user).filter(pk__gt=last_pk).order_by('pk')[:remaining + 1])
+        last_pk = 0
+        if len(rows) > remaining:
+            rows = rows[:remaining]
+            payload['has_more'] = True
+            payload['next'] = f'{cursor}.{entity}.{rows[-1].pk}'
+        payload[SECTIONS[entity]] = serializer_class(rows, many=True).data
+        if payload['has_more']:
+            break
+        remaining -= len(rows)
+    return payload
+
+
+def build_delta(user, since, limit=DEFAULT_LIMIT):
+    """Return rows changed since the `since` watermark.
+
+    Only the change log and the changed rows are read, so the work done is
+    proportional to the number of changes rather than to the data size.
+    """
+    entries = list(
+        ChangeLog.objects.filter(user=user, id__gt=since)
+        .order_by('id')
+        .values_list('id', 'entity', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    payload = _empty_payload(entries[-1][0] if entries else since)
+    payload['has_more'] = has_more
+
+    # Collapse the log to the latest action per object
+    latest = {}
+    for _, entity, object_id, action in entries:
+        latest[(entity, object_id)] = action
+
+    for entity, (get_queryset, serializer_class) in QUERYSETS.items():
+        section = SECTIONS[entity]
+        upserted = [oid for (e, oid), action in latest.items() if e == entity and action == 'upsert']
+        deleted = [oid for (e, oid), action in latest.items() if e == entity and action == 'delete']
+
+        rows = list(get_queryset(user).filter(pk__in=upserted)) if upserted else []
+        # Rows logged as upserted but gone since are reported as deleted
+        found = {row.pk for row in rows}
+        deleted.extend(oid for oid in upserted if oid not in found)
+
+        payload[section] = serializer_class(rows, many=True).data
+        payload['deleted'][section] = sorted(deleted)
+
+    return payload
@@ -1,3 +1,589 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+from unittest import mock
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from . import instrumentation
+from .authentication import CachedTokenAuthentication, _local_cache
+from .expiry import scan_expiring_items
+from .exports import shopping_lists, stream_export
+from .fingerprints import compact_recipes, recipe_fingerprint
+from .ingredients import bump_index_version
+from .meal_planning import persist_meal_plan
+from .models import (
+    ArchivedMealPlan, ChangeLog, Ingredient, MealPlan,
+    MealPlanRecipe, Recipe, RecipeIngredient, UserPantry
+)
+from .parsing import LLMOutputError, extract_json, parse_meals
+from .prompts import expand_recipe
+from .retention import archive_old_plans, collect_orphaned_recipes
+from .serializers import RecipeSerializer
+from .signals import run_on_commit
 
-# Create your tests here.
+
+def make_recipe(name, ingredients, **kwargs):
+    recipe = Recipe.objects.create(
+        name=name, description='', instructions='', prep_time=10, cook_time=10, servings=2, **kwargs
+    )
+    for ingredient, quantity in ingredients:
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient, quantity=quantity, unit=ingredient.unit)
+    return recipe
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        _local_cache.clear()
+        self.user = User.objects.create_user('token', password='pw')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_lookups_skip_the_database(self):
+        auth = CachedTokenAuthentication()
+        auth.authenticate_credentials(self.token.key)
+        with CaptureQueriesContext(connection) as queries:
+            user, _ = auth.authenticate_credentials(self.token.key)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_each_request_gets_its_own_user_without_password(self):
+        auth = CachedTokenAuthentication()
+        first, _ = auth.authenticate_credentials(self.token.key)
+        second, _ = auth.authenticate_credentials(self.token.key)
+        self.assertIsNot(first, second)
+        self.assertNotIn('password', first.__dict__)
+
+    def test_logout_revokes_the_cached_token(self):
+        self.assertEqual(self.client.get('/api/pantry/').status_code, 200)
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/pantry/').status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get('/api/pantry/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/pantry/').status_code, 401)
+
+
+class BulkPantryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pantry', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.rice = Ingredient.objects.create(name='rice', cost_per_unit=Decimal('1.00'))
+        self.beans = Ingredient.objects.create(name='beans', cost_per_unit=Decimal('1.00'))
+        UserPantry.objects.create(user=self.user, ingredient=self.rice, quantity=2)
+
+    def bulk(self, method, data):
+        return getattr(self.client, method)('/api/pantry/bulk/', data, format='json')
+
+    def test_post_merges_into_existing_rows(self):
+        response = self.bulk('post', [
+            {'ingredient': self.rice.pk, 'quantity': '1.5'},
+            {'ingredient': self.rice.pk, 'quantity': '0.5'},
+            {'ingredient': self.beans.pk, 'quantity': '3'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        quantities = dict(UserPantry.objects.values_list('ingredient__name', 'quantity'))
+        self.assertEqual(quantities, {'rice': Decimal('4.00'), 'beans': Decimal('3.00')})
+
+    def test_put_overwrites_existing_rows(self):
+        self.bulk('put', [{'ingredient': self.rice.pk, 'quantity': '7'}])
+        self.assertEqual(UserPantry.objects.get(ingredient=self.rice).quantity, Decimal('7.00'))
+
+    def test_merged_quantity_over_column_limit_is_rejected(self):
+        response = self.bulk('post', [
+            {'ingredient': self.beans.pk, 'quantity': '9999'},
+            {'ingredient': self.beans.pk, 'quantity': '9999'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UserPantry.objects.filter(ingredient=self.beans).exists())
+
+    def test_unknown_ingredient_is_rejected(self):
+        response = self.bulk('post', [{'ingredient': 999, 'quantity': '1'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['ingredients'], [999])
+
+    def test_delete_removes_only_own_rows(self):
+        other = User.objects.create_user('other', password='pw')
+        theirs = UserPantry.objects.create(user=other, ingredient=self.rice, quantity=1)
+        mine = UserPantry.objects.get(user=self.user)
+        response = self.bulk('delete', {'ids': [mine.pk, theirs.pk]})
+        self.assertEqual(response.data, {'deleted': 1})
+        self.assertTrue(UserPantry.objects.filter(pk=theirs.pk).exists())
+
+    def test_delete_rejects_non_integer_ids(self):
+        self.assertEqual(self.bulk('delete', {'ids': ['abc']}).status_code, 400)
+
+
+class PriceImportTests(TestCase):
+    def setUp(self):
+        self.tomato = Ingredient.objects.create(
+            name='tomato', unit='lbs', category='vegetables', cost_per_unit=Decimal('1.00')
+        )
+        # Index updates wait for a commit, which TestCase never makes
+        bump_index_version()
+        user = User.objects.create_user('prices', password='pw')
+        self.plan = MealPlan.objects.create(user=user, start_date=date.today(), end_date=date.today(), total_cost=0)
+        MealPlanRecipe.objects.create(
+            meal_plan=self.plan, recipe=make_recipe('Salad', [(self.tomato, 2)]), day=1, meal_type='lunch'
+        )
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def run_import(self, filename, content):
+        path = os.path.join(self.directory.name, filename)
+        with open(path, 'w') as handle:
+            handle.write(content)
+        out = StringIO()
+        call_command('import_ingredient_prices', path, stdout=out)
+        return out.getvalue()
+
+    def test_updates_price_but_not_unit_or_category(self):
+        self.run_import('prices.csv', 'name,price,unit,category\n Tomatoes ,$2.50,,fruits\nbasil,3,pieces,spices\n')
+        self.tomato.refresh_from_db()
+        self.assertEqual(
+            (self.tomato.cost_per_unit, self.tomato.unit, self.tomato.category),
+            (Decimal('2.50'), 'lbs', 'vegetables')
+        )
+        self.assertEqual(Ingredient.objects.get(name='basil').category, 'spices')
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.total_cost, Decimal('5.00'))
+
+    def test_skips_rows_in_another_unit(self):
+        out = self.run_import('prices.csv', 'name,price,unit\ntomato,9,kg\n')
+        self.tomato.refresh_from_db()
+        self.assertEqual(self.tomato.cost_per_unit, Decimal('1.00'))
+        self.assertIn('1 in a different unit', out)
+
+    def test_malformed_json_lines_are_counted_not_fatal(self):
+        out = self.run_import('prices.csv.jsonl', '{"name": "tomato", "price": 4}\n{oops\n[1]\n')
+        self.tomato.refresh_from_db()
+        self.assertEqual(self.tomato.cost_per_unit, Decimal('4.00'))
+        self.assertIn('skipped 2 (1 malformed lines', out)
+
+
+def generated_meal(day, name, ingredients, meal_type='dinner'):
+    return {
+        'day': day,
+        'meal_type': meal_type,
+        'recipe': {
+            'name': name,
+            'description': '',
+            'instructions': 'Cook',
+            'ingredients': [{'name': item, 'quantity': 1, 'unit': 'pieces'} for item in ingredients],
+        },
+    }
+
+
+class FingerprintTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('fingerprint', password='pw')
+        self.onion = Ingredient.objects.create(name='onion', cost_per_unit=Decimal('0.50'))
+        self.leek = Ingredient.objects.create(name='leek', cost_per_unit=Decimal('1.00'))
+        bump_index_version()
+
+    def test_generate_reuses_identical_recipes(self):
+        persist_meal_plan(self.user, 2, [
+            generated_meal(1, 'Onion soup', ['onions']),
+            generated_meal(2, 'Onion Soup', ['onion']),
+        ])
+        persist_meal_plan(self.user, 1, [generated_meal(1, 'onion soup', ['Onion'])])
+        self.assertEqual(Recipe.objects.count(), 1)
+        self.assertEqual(MealPlanRecipe.objects.filter(recipe__name='Onion soup').count(), 3)
+
+    def test_editing_ingredients_refreshes_the_fingerprint(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = make_recipe('Soup', [(self.onion, 1)])
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=self.leek, quantity=1, unit='pieces')
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.fingerprint, recipe_fingerprint('Soup', [self.onion.pk, self.leek.pk]))
+
+    def test_compaction_only_merges_generated_recipes(self):
+        fingerprint = recipe_fingerprint('Soup', [self.onion.pk])
+        keep = make_recipe('Soup', [(self.onion, 1)], fingerprint=fingerprint, is_generated=True)
+        duplicate = make_recipe('Soup', [(self.onion, 1)], fingerprint=fingerprint, is_generated=True)
+        saved = make_recipe('Soup', [(self.onion, 1)], fingerprint=fingerprint)
+        plan = MealPlan.objects.create(user=self.user, start_date=date.today(), end_date=date.today(), total_cost=0)
+        slot = MealPlanRecipe.objects.create(meal_plan=plan, recipe=duplicate, day=1, meal_type='lunch')
+
+        self.assertEqual(compact_recipes(), (1, 1))
+        self.assertEqual(set(Recipe.objects.values_list('pk', flat=True)), {keep.pk, saved.pk})
+        slot.refresh_from_db()
+        self.assertEqual(slot.recipe_id, keep.pk)
+
+
+class RecipeBatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('batch', password='pw'))
+        self.recipes = [make_recipe(f'Recipe {n}', []) for n in range(12)]
+
+    def test_ids_return_the_requested_recipes_unpaginated(self):
+        ids = ','.join(str(recipe.pk) for recipe in self.recipes[:3])
+        response = self.client.get(f'/api/recipes/?ids={ids}')
+        self.assertEqual(sorted(row['id'] for row in response.data), [r.pk for r in self.recipes[:3]])
+
+    def test_empty_ids_are_paginated(self):
+        response = self.client.get('/api/recipes/?ids=')
+        self.assertEqual(response.data['count'], 12)
+        self.assertLess(len(response.data['results']), 12)
+
+    def test_too_many_ids_are_rejected(self):
+        ids = ','.join(str(n) for n in range(1, 200))
+        self.assertEqual(self.client.get(f'/api/recipes/?ids={ids}').status_code, 400)
+
+    def test_non_integer_ids_are_rejected(self):
+        self.assertEqual(self.client.get('/api/recipes/?ids=1,abc').status_code, 400)
+
+
+class OnCommitTests(TestCase):
+    def test_price_change_recomputes_costs_after_commit(self):
+        rice = Ingredient.objects.create(name='rice', cost_per_unit=Decimal('1.00'))
+        user = User.objects.create_user('costs', password='pw')
+        plan = MealPlan.objects.create(user=user, start_date=date.today(), end_date=date.today(), total_cost=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            MealPlanRecipe.objects.create(meal_plan=plan, recipe=make_recipe('Rice', [(rice, 2)]), day=1, meal_type='lunch')
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            rice.cost_per_unit = Decimal('3.00')
+            rice.save()
+            plan.refresh_from_db()
+            self.assertEqual(plan.total_cost, Decimal('2.00'))
+        self.assertEqual(len(callbacks), 1)
+        plan.refresh_from_db()
+        self.assertEqual(plan.total_cost, Decimal('6.00'))
+
+    def test_rolled_back_ids_are_not_handled(self):
+        calls = []
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                run_on_commit('test', [1], calls.append)
+                raise ValueError
+        with self.captureOnCommitCallbacks(execute=True):
+            run_on_commit('test', [2], calls.append)
+            run_on_commit('test', [3], calls.append)
+        self.assertEqual(calls, [[2, 3]])
+
+
+class SwapTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        rice = Ingredient.objects.create(name='rice', unit='cups', category='grains', cost_per_unit=Decimal('1.00'))
+        beef = Ingredient.objects.create(name='beef', unit='lbs', category='meat', cost_per_unit=Decimal('4.00'))
+        self.cheap = make_recipe('Rice', [(rice, 3)])
+        self.dear = make_recipe('Beef', [(beef, 2)])
+        self.plan = MealPlan.objects.create(
+            user=self.user, start_date=date.today(), end_date=date.today(), total_cost=Decimal('3.00')
+        )
+        MealPlanRecipe.objects.create(meal_plan=self.plan, recipe=self.cheap, day=1, meal_type='dinner')
+
+    def swap(self, data):
+        return self.client.post(f'/api/meal-plans/{self.plan.pk}/swap/', data, format='json')
+
+    def test_applies_cost_difference_for_string_recipe_id(self):
+        response = self.swap({'day': 1, 'meal_type': 'dinner', 'recipe_id': str(self.dear.pk)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_cost'], '8.00')
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.total_cost, Decimal('8.00'))
+
+    def test_swap_does_not_also_recompute_the_plan(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.swap({'day': 1, 'meal_type': 'dinner', 'recipe_id': self.dear.pk})
+        self.assertEqual(callbacks, [])
+
+    def test_rejects_non_numeric_recipe_id(self):
+        response = self.swap({'day': 1, 'meal_type': 'dinner', 'recipe_id': 'beef'})
+        self.assertEqual(response.status_code, 400)
+
+
+class InstrumentationTests(TestCase):
+    def test_span_outside_a_request_does_no_work(self):
+        with mock.patch('api.instrumentation.threading.get_ident') as get_ident:
+            with instrumentation.span('db'):
+                pass
+        get_ident.assert_not_called()
+
+    def test_only_top_level_serializers_are_timed(self):
+        salt = Ingredient.objects.create(name='salt', cost_per_unit=Decimal('0.10'))
+        recipes = [make_recipe(f'Dish {n}', [(salt, 1)]) for n in range(2)]
+        metrics, token = instrumentation.start_request()
+        try:
+            with mock.patch('api.instrumentation.span', wraps=instrumentation.span) as span:
+                RecipeSerializer(recipes, many=True).data
+        finally:
+            instrumentation.end_request(token)
+        self.assertEqual(span.call_count, 2)
+        self.assertIn('serialize', metrics.spans)
+
+
+@override_settings(API_METRICS_TOKEN='scrape')
+class MetricsAccessTests(TestCase):
+    def test_bearer_token_is_accepted(self):
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, 200)
+
+    def test_staff_session_is_accepted(self):
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 200)
+
+    def test_other_requests_are_forbidden(self):
+        self.client.force_login(User.objects.create_user('member', password='pw'))
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('old', password='pw')
+        self.leek = Ingredient.objects.create(name='leek', cost_per_unit=Decimal('1.00'))
+
+    def test_archives_old_plans(self):
+        old = MealPlan.objects.create(
+            user=self.user, start_date=date(2020, 1, 1), end_date=date(2020, 1, 7), total_cost=Decimal('2.00')
+        )
+        recent = MealPlan.objects.create(user=self.user, start_date=date.today(), end_date=date.today(), total_cost=0)
+        slot = MealPlanRecipe.objects.create(
+            meal_plan=old, recipe=make_recipe('Soup', [(self.leek, 2)]), day=1, meal_type='lunch'
+        )
+
+        self.assertEqual(archive_old_plans(retention_days=30), (1, 1))
+        self.assertEqual(list(MealPlan.objects.values_list('pk', flat=True)), [recent.pk])
+        archived = ArchivedMealPlan.objects.get(original_id=old.pk)
+        self.assertEqual(archived.slots[0]['recipe']['name'], 'Soup')
+        self.assertEqual(archived.slots[0]['recipe']['ingredients'][0]['name'], 'leek')
+        self.assertTrue(ChangeLog.objects.filter(entity='meal_plan_recipe', object_id=slot.pk, action='delete').exists())
+
+    def test_zero_retention_days_is_not_the_default(self):
+        yesterday = date.today() - timedelta(days=1)
+        MealPlan.objects.create(user=self.user, start_date=yesterday, end_date=yesterday, total_cost=0)
+        self.assertEqual(archive_old_plans(retention_days=0), (1, 0))
+
+    def test_collects_only_unused_generated_recipes(self):
+        orphan = make_recipe('Orphan', [(self.leek, 1)], is_generated=True)
+        used = make_recipe('Used', [(self.leek, 1)], is_generated=True)
+        saved = make_recipe('Saved', [(self.leek, 1)])
+        plan = MealPlan.objects.create(user=self.user, start_date=date.today(), end_date=date.today(), total_cost=0)
+        MealPlanRecipe.objects.create(meal_plan=plan, recipe=used, day=1, meal_type='dinner')
+
+        reclaimed = collect_orphaned_recipes(batch_size=1)
+        self.assertEqual(reclaimed[Recipe._meta.label], 1)
+        self.assertEqual(reclaimed[RecipeIngredient._meta.label], 1)
+        self.assertFalse(Recipe.objects.filter(pk=orphan.pk).exists())
+        self.assertEqual(set(Recipe.objects.values_list('pk', flat=True)), {used.pk, saved.pk})
+
+
+class LLMOutputTests(TestCase):
+    def test_ignores_prose_and_fences(self):
+        text = 'Here is your plan:\n```json\n{"m": [{"d": 1}]}\n```\nEnjoy!'
+        self.assertEqual(extract_json(text), {'m': [{'d': 1}]})
+
+    def test_truncated_output_keeps_only_complete_items(self):
+        text = (
+            '{"m":[{"d":1,"t":"b","r":{"n":"Eggs","i":[["egg",2,"pieces"]],"s":"Fry"}},'
+            '{"d":1,"t":"l","r":{"n":"Rice bowl","i":[["rice",1,"cups"],'
+        )
+        value = extract_json(text)
+        self.assertEqual(len(value['m']), 1)
+        self.assertEqual(value['m'][0]['r']['n'], 'Eggs')
+
+    def test_truncated_single_item_is_not_salvaged(self):
+        with self.assertRaises(LLMOutputError):
+            extract_json('{"name": "Soup", "ingredients": [{"name": "leek", "quantity": 1},')
+
+    def test_parse_meals_drops_partial_meal(self):
+        text = (
+            '{"m":[{"d":1,"t":"d","r":{"n":"Pasta","i":[["pasta",200,"g"]]}},'
+            '{"d":2,"t":"d","r":{"n":"Stew","i":[["beef",1,"lbs"]'
+        )
+        meals, errors = parse_meals(text)
+        self.assertEqual([(meal['day'], meal['recipe']['name']) for meal in meals], [(1, 'Pasta')])
+        self.assertEqual(errors, [])
+
+    def test_bare_ingredient_names_are_kept_whole(self):
+        recipe = expand_recipe({'n': 'Rice', 'i': ['salt', ['rice', 1, 'cups']]})
+        self.assertEqual(recipe['ingredients'], [
+            {'name': 'salt', 'quantity': None, 'unit': 'pieces'},
+            {'name': 'rice', 'quantity': 1, 'unit': 'cups'},
+        ])
+
+
+class ExpiringSoonTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('expiry', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        milk = Ingredient.objects.create(name='milk', cost_per_unit=Decimal('1.00'))
+        self.item = UserPantry.objects.create(
+            user=self.user, ingredient=milk, quantity=1, expiry_date=date.today() + timedelta(days=1)
+        )
+        scan_expiring_items(window_days=7)
+
+    def test_fresh_digest_is_served(self):
+        # Bypass the save signal so only the digest still has the old quantity
+        UserPantry.objects.filter(pk=self.item.pk).update(quantity=5)
+        response = self.client.get('/api/pantry/expiring_soon/')
+        self.assertEqual(response.data[0]['quantity'], '1.00')
+
+    def test_selected_fields_are_honoured(self):
+        response = self.client.get('/api/pantry/expiring_soon/', {'fields': 'id,quantity'})
+        self.assertEqual(response.data, [{'id': self.item.pk, 'quantity': '1.00'}])
+
+
+class CookTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('chef', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.rice = Ingredient.objects.create(name='rice', unit='cups', cost_per_unit=Decimal('1.00'))
+        self.salt = Ingredient.objects.create(name='salt', unit='grams', cost_per_unit=Decimal('0.01'))
+        recipe = make_recipe('Rice', [(self.rice, 3)])
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=self.salt, quantity=1, unit='tsp')
+        self.plan = MealPlan.objects.create(user=self.user, start_date=date.today(), end_date=date.today(), total_cost=0)
+        self.slot = MealPlanRecipe.objects.create(meal_plan=self.plan, recipe=recipe, day=1, meal_type='dinner')
+        self.soon = UserPantry.objects.create(
+            user=self.user, ingredient=self.rice, quantity=2, expiry_date=date.today() + timedelta(days=1)
+        )
+        self.later = UserPantry.objects.create(user=self.user, ingredient=self.rice, quantity=5)
+        UserPantry.objects.create(user=self.user, ingredient=self.salt, quantity=100)
+
+    def cook(self, data):
+        return self.client.post(f'/api/meal-plans/{self.plan.pk}/cook/', data, format='json')
+
+    def test_deducts_from_rows_expiring_first(self):
+        response = self.cook({'day': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(UserPantry.objects.filter(pk=self.soon.pk).exists())
+        self.later.refresh_from_db()
+        self.assertEqual(self.later.quantity, Decimal('4.00'))
+        self.slot.refresh_from_db()
+        self.assertIsNotNone(self.slot.cooked_at)
+
+    def test_amounts_in_another_unit_are_reported_not_deducted(self):
+        response = self.cook({'slot': self.slot.pk})
+        self.assertEqual(UserPantry.objects.get(ingredient=self.salt).quantity, Decimal('100.00'))
+        self.assertIn(self.salt.pk, [item['ingredient'] for item in response.data['missing']])
+
+    def test_cooked_slots_are_not_deducted_twice(self):
+        self.cook({})
+        self.assertEqual(self.cook({}).data['cooked'], [])
+        self.later.refresh_from_db()
+        self.assertEqual(self.later.quantity, Decimal('4.00'))
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('sync', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for index in range(5):
+            ingredient = Ingredient.objects.create(name=f'item {index}', cost_per_unit=Decimal('1.00'))
+            UserPantry.objects.create(user=self.user, ingredient=ingredient, quantity=1)
+        plan = MealPlan.objects.create(user=self.user, start_date=date.today(), end_date=date.today(), total_cost=0)
+        MealPlanRecipe.objects.create(meal_plan=plan, recipe=make_recipe('Toast', []), day=1, meal_type='breakfast')
+
+    def test_full_snapshot_is_paged(self):
+        seen = {'pantry': 0, 'meal_plans': 0, 'meal_plan_recipes': 0}
+        params = {'limit': 2}
+        pages = 0
+        while True:
+            page = self.client.get('/api/sync/', params).data
+            pages += 1
+            self.assertTrue(page['full'])
+            for section in seen:
+                seen[section] += len(page[section])
+            if not page['has_more']:
+                break
+            params = {'limit': 2, 'snapshot': page['next']}
+        self.assertEqual(seen, {'pantry': 5, 'meal_plans': 1, 'meal_plan_recipes': 1})
+        self.assertEqual(pages, 4)
+
+    def test_delta_pages_advance_the_cursor(self):
+        since = 1
+        for limit in ('0', '-5'):
+            page = self.client.get('/api/sync/', {'since': since, 'limit': limit}).data
+            self.assertTrue(page['has_more'])
+            self.assertGreater(page['cursor'], since)
+            since = page['cursor']
+
+    def test_invalid_snapshot_token(self):
+        self.assertEqual(self.client.get('/api/sync/', {'snapshot': 'nope'}).status_code, 400)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('export', password='pw')
+        self.egg = Ingredient.objects.create(name='egg', unit='pieces', cost_per_unit=Decimal('0.30'))
+        self.milk = Ingredient.objects.create(name='milk', unit='cups', cost_per_unit=Decimal('0.50'))
+        omelette = make_recipe('Omelette', [(self.egg, 3), (self.milk, 1)])
+        self.plan = MealPlan.objects.create(
+            user=self.user, start_date=date.today(), end_date=date.today() + timedelta(days=1), total_cost=0
+        )
+        for day in (1, 2):
+            MealPlanRecipe.objects.create(meal_plan=self.plan, recipe=omelette, day=day, meal_type='breakfast')
+        UserPantry.objects.create(user=self.user, ingredient=self.egg, quantity=4)
+
+    def test_shopping_list_sums_slots_and_subtracts_pantry(self):
+        rows = {row['ingredient']: row for row in shopping_lists(self.user)}
+        self.assertEqual(rows['egg']['needed'], 6.0)
+        self.assertEqual(rows['egg']['total_quantity'], 2.0)
+        self.assertEqual(rows['milk']['total_quantity'], 2.0)
+        self.assertEqual({row['meal_plan_id'] for row in rows.values()}, {self.plan.pk})
+
+    def test_csv_export_has_header_and_one_row_per_item(self):
+        lines = ''.join(stream_export(self.user, 'csv', ['pantry'])).splitlines()
+        self.assertEqual(lines[0], 'id,ingredient,quantity,unit,expiry_date,added_date,updated_date')
+        self.assertEqual(len(lines), 2)
+        self.assertIn(',egg,4.00,pieces,', lines[1])
+
+    def test_jsonl_export_tags_rows_with_their_section(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/export/jsonl/', {'sections': 'meal_plans,pantry'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['section'] for row in rows], ['meal_plans', 'meal_plans', 'pantry'])
+        self.assertEqual([row['day'] for row in rows[:2]], [1, 2])
+        self.assertEqual(rows[2]['ingredient'], 'egg')
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', password='pw')
+        self.client.force_login(self.admin)
+
+    def test_recipe_search_matches_name_prefix(self):
+        make_recipe('Onion soup', [])
+        make_recipe('Leek and onion pie', [])
+        response = self.client.get('/admin/api/recipe/', {'q': 'onion'})
+        self.assertEqual([recipe.name for recipe in response.context['cl'].result_list], ['Onion soup'])
+
+    def test_meal_plan_changelist_query_count_does_not_grow(self):
+        def changelist_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get('/admin/api/mealplan/').status_code, 200)
+            return len(queries)
+
+        MealPlan.objects.create(user=self.admin, start_date=date.today(), end_date=date.today(), total_cost=0)
+        baseline = changelist_queries()
+        for n in range(5):
+            user = User.objects.create_user(f'planner {n}', password='pw')
+            MealPlan.objects.create(user=user, start_date=date.today(), end_date=date.today(), total_cost=0)
+        self.assertEqual(changelist_queries(), baseline)
+
+    def test_ingredient_autocomplete_is_served(self):
+        Ingredient.objects.create(name='rice', cost_per_unit=Decimal('1.00'))
+        response = self.client.get('/admin/autocomplete/', {
+            'term': 'ri', 'app_label': 'api', 'model_name': 'recipeingredient', 'field_name': 'ingredient'
+        })
+        self.assertEqual([result['text'] for result in response.json()['results']], ['rice'])
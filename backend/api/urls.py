@@ -15,4 +15,7 @@ urlpatterns = [
     path('auth/register/', views.register, name='register'),
     path('auth/login/', views.login_view, name='login'),
     path('auth/logout/', views.logout_view, name='logout'),
+    path('sync/', views.sync_view, name='sync'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('export/<str:file_format>/', views.export_view, name='export'),
 ] 
\ No newline at end of file
@@ -3,27 +3,45 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import viewsets, status, pagination
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.contrib.auth import login, logout
 from rest_framework.authtoken.models import Token
 from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from .models import (
     Ingredient, Recipe, RecipeIngredient,
-    UserPreference, MealPlan, MealPlanRecipe, UserPantry
+    UserPreference, MealPlan, MealPlanRecipe, UserPantry,
+    FeedEntry
 )
 from .serializers import (
     IngredientSerializer, RecipeSerializer,
     UserPreferenceSerializer, MealPlanSerializer,
     UserSerializer, UserRegistrationSerializer,
-    UserPantryCreateSerializer, UserPantrySerializer
+    UserPantryCreateSerializer, UserPantrySerializer,
+    UserPantryBulkItemSerializer, UserPantryBulkDeleteSerializer,
+    request_field_spec, is_requested, normalized_meal_plans
 )
+from . import llm, prompts, sync
+from .authentication import invalidate_token
+from .alternatives import ranked_alternatives
+from .costs import recipe_costs
+from .meal_planning import MAX_MEALS_PER_DAY, MAX_PLAN_DAYS, generate_meals, persist_meal_plan
+from .parsing import parse_recipes
+from .instrumentation import registry
+from .exports import SECTIONS as EXPORT_SECTIONS, shopping_lists, stream_export
+from .expiry import cached_expiring_items, expiring_queryset
+from .pantry import (
+    MAX_BULK_ITEMS, missing_ingredients,
+    upsert_pantry_items, delete_pantry_items,
+    cook_meal_plan_slots
+)
+import hmac
 import openai
-from datetime import datetime, timedelta
-import json
 import os
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Q, prefetch_related_objects
 
 # Configure OpenAI
 openai.api_key = os.getenv('OPENAI_API_KEY')
@@ -33,11 +51,7 @@ if not openai.api_key:
 def check_openai_api():
     try:
         # Make a simple API call to verify the key
-        openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": "Test"}],
-            max_tokens=5
-        )
+        llm.chat('test', 'You are a helpful assistant.', 'Test', max_tokens=5)
         return True
     except Exception as e:
         print(f"OpenAI API Error: {str(e)}")
@@ -55,6 +69,7 @@ def test_api(request):
     })
 
 @api_view(['POST'])
+@permission_classes([AllowAny])
 def register(request):
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
@@ -67,6 +82,7 @@ def register(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['POST'])
+@permission_classes([AllowAny])
 def login_view(request):
     username = request.data.get('username')
     password = request.data.get('password')
@@ -87,10 +103,79 @@ def login_view(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout_view(request):
+    invalidate_token(request.user.auth_token.key)
     request.user.auth_token.delete()
     logout(request)
     return Response({'message': 'Successfully logged out'})
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_view(request):
+    """Return pantry and meal plan changes since the client's watermark.
+
+    Without a `since` cursor the full data set is returned a page at a
+    time: pass each page's `next` token back as `snapshot` until
+    `has_more` is false, then use `cursor` for the next call.
+    """
+    try:
+        since = int(request.query_params.get('since', 0))
+        limit = max(1, min(int(request.query_params.get('limit', sync.DEFAULT_LIMIT)), sync.MAX_LIMIT))
+    except ValueError:
+        return Response({'error': 'since and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if since <= 0:
+        try:
+            return Response(sync.full_snapshot(request.user, limit, request.query_params.get('snapshot')))
+        except ValueError:
+            return Response({'error': 'Invalid snapshot token'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(sync.build_delta(request.user, since, limit))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_view(request, file_format):
+    """Stream the user's meal plans, pantry, pantry history and shopping lists.
+
+    `file_format` is csv (one section, chosen with `sections`) or jsonl (all
+    sections by default, each row tagged with its section).
+    """
+    if file_format not in ('csv', 'jsonl'):
+        return Response({'error': 'Export format must be csv or jsonl'}, status=status.HTTP_404_NOT_FOUND)
+    sections = [name for name in request.query_params.get('sections', '').split(',') if name]
+    if not sections:
+        sections = ['meal_plans'] if file_format == 'csv' else list(EXPORT_SECTIONS)
+    unknown = [name for name in sections if name not in EXPORT_SECTIONS]
+    if unknown:
+        return Response(
+            {'error': f'Unknown sections: {", ".join(unknown)}. Choose from {", ".join(EXPORT_SECTIONS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if file_format == 'csv' and len(sections) > 1:
+        return Response({'error': 'CSV exports contain a single section'}, status=status.HTTP_400_BAD_REQUEST)
+
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(stream_export(request.user, file_format, sections), content_type=content_type)
+    filename = f'export-{request.user.username}-{"-".join(sections) if file_format == "csv" else "all"}.{file_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def metrics_allowed(request):
+    token = settings.API_METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '').encode()
+    if token and hmac.compare_digest(header, f'Bearer {token}'.encode()):
+        return True
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.API_METRICS_ALLOWED_IPS
+
+def metrics_view(request):
+    """Prometheus metrics for request timing; see API_METRICS_TOKEN."""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4')
+
+# Upper bound on recipes fetched through ?ids=
+MAX_BATCH_IDS = 100
+
 class CustomPagination(pagination.PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
@@ -104,6 +189,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = Recipe.objects.all()
+
+        # Batch retrieval: ?ids=1,2,3 returns those recipes in one response
+        id_list = self.batch_ids()
+        if id_list:
+            queryset = queryset.filter(pk__in=id_list)
+
+        # Only prefetch the relations the response will include
+        if self.action in ('list', 'retrieve'):
+            spec = request_field_spec(self.request)
+            if is_requested(spec, 'ingredients', 'ingredient'):
+                queryset = queryset.prefetch_related('recipeingredient_set__ingredient')
+            elif is_requested(spec, 'ingredients'):
+                queryset = queryset.prefetch_related('recipeingredient_set')
         
         # Search by recipe name
         name = self.request.query_params.get('name', None)
@@ -116,7 +214,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             ingredient_list = ingredients.split(',')
             for ingredient in ingredient_list:
                 queryset = queryset.filter(
-                    recipeingredient_set__ingredient__name__icontains=ingredient.strip()
+                    recipeingredient__ingredient__name__icontains=ingredient.strip()
                 )
         
         # Filter by dietary restrictions
@@ -127,17 +225,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 restriction = restriction.strip().lower()
                 if restriction == 'vegetarian':
                     queryset = queryset.exclude(
-                        recipeingredient_set__ingredient__category__in=['meat', 'fish']
+                        recipeingredient__ingredient__category__in=['meat', 'fish']
                     )
                 elif restriction == 'vegan':
                     queryset = queryset.exclude(
-                        recipeingredient_set__ingredient__category__in=['meat', 'fish', 'dairy', 'eggs']
+                        recipeingredient__ingredient__category__in=['meat', 'fish', 'dairy', 'eggs']
                     )
                 elif restriction == 'gluten-free':
                     queryset = queryset.exclude(
-                        recipeingredient_set__ingredient__name__icontains='wheat'
+                        recipeingredient__ingredient__name__icontains='wheat'
                     ).exclude(
-                        recipeingredient_set__ingredient__name__icontains='gluten'
+                        recipeingredient__ingredient__name__icontains='gluten'
                     )
         
         # Filter by prep time
@@ -157,8 +255,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             # Annotate each recipe with its total cost
             queryset = queryset.annotate(
                 total_cost=models.Sum(
-                    models.F('recipeingredient_set__quantity') * 
-                    models.F('recipeingredient_set__ingredient__cost_per_unit')
+                    models.F('recipeingredient__quantity') * 
+                    models.F('recipeingredient__ingredient__cost_per_unit')
                 )
             )
             if min_cost:
@@ -168,57 +266,50 @@ class RecipeViewSet(viewsets.ModelViewSet):
         
         return queryset.distinct()
 
+    def batch_ids(self):
+        """Parsed ?ids= list, or None when it is absent or names no ids."""
+        if not hasattr(self, '_batch_ids'):
+            try:
+                id_list = [int(pk) for pk in self.request.query_params.get('ids', '').split(',') if pk.strip()]
+            except ValueError:
+                raise ValidationError({'error': 'ids must be a comma-separated list of integers'})
+            if len(id_list) > MAX_BATCH_IDS:
+                raise ValidationError({'error': f'At most {MAX_BATCH_IDS} ids can be requested at once'})
+            self._batch_ids = id_list or None
+        return self._batch_ids
+
+    def paginate_queryset(self, queryset):
+        # Batch lookups return every requested recipe (at most MAX_BATCH_IDS) at once
+        if self.batch_ids():
+            return None
+        return super().paginate_queryset(queryset)
+
     def perform_create(self, serializer):
         serializer.save()
 
+    def perform_update(self, serializer):
+        # Edited recipes count as saved by the user and are kept by the GC
+        serializer.save(is_generated=False)
+
     @action(detail=False, methods=['post'])
     def suggest(self, request):
         try:
             # Get available ingredients from pantry
-            pantry_items = UserPantry.objects.filter(user=request.user)
-            pantry_ingredients = [
-                {
-                    'name': item.ingredient.name,
-                    'quantity': float(item.quantity),
-                    'unit': item.ingredient.unit
-                }
-                for item in pantry_items
-            ]
+            pantry_items = UserPantry.objects.filter(user=request.user).select_related('ingredient')
 
             # Get user preferences
             user_preferences = UserPreference.objects.get(user=request.user)
 
-            # Prepare the prompt for OpenAI
-            prompt = f"""
-            Suggest 3 recipes that:
-            1. Use these available ingredients: {json.dumps(pantry_ingredients)}
-            2. Consider these dietary restrictions: {json.dumps(user_preferences.dietary_restrictions)}
-            3. Prefer these cuisines: {json.dumps(user_preferences.preferred_cuisines)}
-            4. Avoid these ingredients: {[ing.name for ing in user_preferences.disliked_ingredients.all()]}
-            5. Are budget-friendly (around ${user_preferences.weekly_budget/7} per meal)
-
-            For each recipe, provide:
-            - Name
-            - Brief description
-            - List of ingredients (with quantities and units)
-            - Step-by-step instructions
-            - Estimated prep and cook time
-            - Number of servings
-            - Total estimated cost
-
-            Format the response as a JSON array of recipes.
-            """
-
-            # Call OpenAI API
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a helpful recipe suggestion assistant."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            # Compact prompt, truncated to the configured token budgets
+            prompt = prompts.suggest_prompt(pantry_items, user_preferences)
+            content = llm.chat('recipes.suggest', "You are a helpful recipe suggestion assistant.", prompt)
 
-            suggested_recipes = json.loads(response.choices[0].message.content)
+            suggested_recipes, _ = parse_recipes(content)
+            if not suggested_recipes:
+                return Response(
+                    {"error": "The model did not return any usable recipes"},
+                    status=status.HTTP_502_BAD_GATEWAY
+                )
             return Response(suggested_recipes, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -233,42 +324,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
             recipe_id = request.data.get('recipe_id')
             variations_count = request.data.get('variations', 3)
             
-            original_recipe = Recipe.objects.get(id=recipe_id)
-            ingredients = [
-                {
-                    'name': ri.ingredient.name,
-                    'quantity': float(ri.quantity),
-                    'unit': ri.unit
-                }
-                for ri in original_recipe.recipeingredient_set.all()
-            ]
-
-            prompt = f"""
-            Create {variations_count} variations of this recipe:
-            Name: {original_recipe.name}
-            Description: {original_recipe.description}
-            Ingredients: {json.dumps(ingredients)}
-            Instructions: {original_recipe.instructions}
-
-            For each variation:
-            1. Keep the same basic structure but change some ingredients or techniques
-            2. Maintain similar cooking time and difficulty level
-            3. Keep the same number of servings
-            4. Provide a new name, description, and modified ingredients list
-            5. Adjust the instructions accordingly
-
-            Format the response as a JSON array of recipe variations.
-            """
-
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a creative recipe variation generator."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-
-            variations = json.loads(response.choices[0].message.content)
+            original_recipe = Recipe.objects.prefetch_related(
+                'recipeingredient_set__ingredient'
+            ).get(id=recipe_id)
+
+            prompt = prompts.variations_prompt(original_recipe, variations_count)
+            content = llm.chat('recipes.generate_variations', "You are a creative recipe variation generator.", prompt)
+
+            variations, _ = parse_recipes(content)
+            if not variations:
+                return Response(
+                    {"error": "The model did not return any usable recipes"},
+                    status=status.HTTP_502_BAD_GATEWAY
+                )
             return Response(variations, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -277,6 +345,87 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=True, methods=['get'])
+    def alternatives(self, request, pk=None):
+        """List precomputed swap candidates for a recipe.
+
+        Pass `meal_plan` to favour candidates sharing ingredients with
+        the rest of that plan.
+        """
+        recipe = self.get_object()
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 5)), 20))
+            meal_plan_id = request.query_params.get('meal_plan')
+            meal_plan_id = int(meal_plan_id) if meal_plan_id else None
+        except ValueError:
+            return Response({'error': 'limit and meal_plan must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        plan_ingredients = None
+        exclude = []
+        if meal_plan_id:
+            plan_recipes = MealPlanRecipe.objects.filter(
+                meal_plan_id=meal_plan_id, meal_plan__user=request.user
+            ).exclude(recipe=recipe)
+            exclude = list(plan_recipes.values_list('recipe_id', flat=True))
+            plan_ingredients = set(RecipeIngredient.objects.filter(
+                recipe_id__in=exclude
+            ).values_list('ingredient_id', flat=True))
+
+        candidates = ranked_alternatives(recipe.pk, plan_ingredients, exclude, limit)
+        recipes = Recipe.objects.prefetch_related('recipeingredient_set__ingredient').in_bulk(
+            [candidate_id for candidate_id, _, _ in candidates]
+        )
+        return Response([
+            {
+                'recipe': RecipeSerializer(recipes[candidate_id]).data,
+                'score': round(score, 4),
+                'cost_delta': cost_delta,
+            }
+            for candidate_id, score, cost_delta in candidates
+            if candidate_id in recipes
+        ])
+
+    @action(detail=False, methods=['get'])
+    def feed(self, request):
+        """Page through the user's precomputed recipe recommendations.
+
+        Built by refresh_recommendation_feeds; pass a page's `next` value as
+        `after` to get the following page.
+        """
+        try:
+            after = int(request.query_params.get('after', -1))
+            limit = max(1, min(int(request.query_params.get('limit', CustomPagination.page_size)), CustomPagination.max_page_size))
+        except ValueError:
+            return Response({'error': 'after and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = list(
+            FeedEntry.objects.filter(user=request.user, rank__gt=after).order_by('rank').values(
+                'rank', 'score', 'cost', 'recipe_id', 'recipe__name', 'recipe__description',
+                'recipe__prep_time', 'recipe__cook_time', 'recipe__servings'
+            )[:limit + 1]
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return Response({
+            'results': [
+                {
+                    'rank': row['rank'],
+                    'score': round(row['score'], 4),
+                    'cost': row['cost'],
+                    'recipe': {
+                        'id': row['recipe_id'],
+                        'name': row['recipe__name'],
+                        'description': row['recipe__description'],
+                        'prep_time': row['recipe__prep_time'],
+                        'cook_time': row['recipe__cook_time'],
+                        'servings': row['recipe__servings'],
+                    },
+                }
+                for row in rows
+            ],
+            'next': rows[-1]['rank'] if has_more else None,
+        })
+
 class IngredientViewSet(viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -293,6 +442,12 @@ class UserPreferenceViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+NORMALIZED_PLAN_PREFETCH = 'mealplanrecipe_set__recipe__recipeingredient_set__ingredient'
+
+def _normalized_plan(meal_plan):
+    plans, recipes, ingredients = normalized_meal_plans([meal_plan])
+    return dict(plans[0], recipes=recipes, ingredients=ingredients)
+
 class MealPlanViewSet(viewsets.ModelViewSet):
     queryset = MealPlan.objects.all()
     serializer_class = MealPlanSerializer
@@ -309,134 +464,85 @@ class MealPlanViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(start_date__gte=start_date)
         if end_date:
             queryset = queryset.filter(end_date__lte=end_date)
+
+        # Only prefetch the relations the response will include
+        if self.action in ('list', 'retrieve'):
+            spec = request_field_spec(self.request)
+            lookups = [
+                (('recipes',), 'mealplanrecipe_set'),
+                (('recipes', 'recipe'), 'mealplanrecipe_set__recipe'),
+                (('recipes', 'recipe', 'ingredients'), 'mealplanrecipe_set__recipe__recipeingredient_set'),
+                (('recipes', 'recipe', 'ingredients', 'ingredient'),
+                 'mealplanrecipe_set__recipe__recipeingredient_set__ingredient'),
+            ]
+            queryset = queryset.prefetch_related(*[
+                lookup for path, lookup in lookups if is_requested(spec, *path)
+            ])
         
         # Order by most recent first
         return queryset.order_by('-created_at')
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('shape') != 'normalized':
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        plans, recipes, ingredients = normalized_meal_plans(page if page is not None else list(queryset))
+        if page is None:
+            return Response({'results': plans, 'recipes': recipes, 'ingredients': ingredients})
+        response = self.get_paginated_response(plans)
+        response.data['recipes'] = recipes
+        response.data['ingredients'] = ingredients
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return one plan; `?shape=normalized` lists each recipe and ingredient once."""
+        if request.query_params.get('shape') != 'normalized':
+            return super().retrieve(request, *args, **kwargs)
+        return Response(_normalized_plan(self.get_object()))
+
     @action(detail=False, methods=['post'])
     def generate(self, request):
         try:
             user_preferences = UserPreference.objects.get(user=request.user)
             
             # Get parameters from request
-            days = int(request.data.get('days', 7))  # Default to 7 days
-            meals_per_day = int(request.data.get('meals_per_day', 3))  # Default to 3 meals
+            try:
+                days = int(request.data.get('days', 7))  # Default to 7 days
+                meals_per_day = int(request.data.get('meals_per_day', 3))  # Default to 3 meals
+            except (TypeError, ValueError):
+                return Response({'error': 'days and meals_per_day must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+            if not 1 <= days <= MAX_PLAN_DAYS or not 1 <= meals_per_day <= MAX_MEALS_PER_DAY:
+                return Response(
+                    {'error': f'days must be 1-{MAX_PLAN_DAYS} and meals_per_day 1-{MAX_MEALS_PER_DAY}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             use_pantry = request.data.get('use_pantry', True)  # Default to using pantry items
             
             # Get available ingredients from pantry
-            pantry_ingredients = []
+            pantry_items = []
             if use_pantry:
-                pantry_items = UserPantry.objects.filter(user=request.user)
-                pantry_ingredients = [
-                    {
-                        'name': item.ingredient.name,
-                        'quantity': float(item.quantity),
-                        'unit': item.ingredient.unit
-                    }
-                    for item in pantry_items
-                ]
-            
-            # Prepare the prompt for OpenAI
-            prompt = f"""
-            Create a {days}-day meal plan that:
-            1. Stays within a budget of ${user_preferences.weekly_budget}
-            2. Uses similar ingredients across meals to minimize waste
-            3. Considers these dietary restrictions: {json.dumps(user_preferences.dietary_restrictions)}
-            4. Prefers these cuisines: {json.dumps(user_preferences.preferred_cuisines)}
-            5. Avoids these ingredients: {[ing.name for ing in user_preferences.disliked_ingredients.all()]}
-            6. Includes {meals_per_day} meals per day
-            {f"7. Uses these available ingredients: {json.dumps(pantry_ingredients)}" if pantry_ingredients else ""}
-
-            Format the response as a JSON with this structure:
-            {{
-                "meals": [
-                    {{
-                        "day": 1,
-                        "meal_type": "breakfast/lunch/dinner",
-                        "recipe": {{
-                            "name": "Recipe Name",
-                            "description": "Brief description",
-                            "instructions": "Step by step instructions",
-                            "ingredients": [
-                                {{
-                                    "name": "Ingredient Name",
-                                    "quantity": 1.5,
-                                    "unit": "cups"
-                                }}
-                            ]
-                        }}
-                    }}
-                ]
-            }}
-            """
-
-            # Call OpenAI API
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a helpful meal planning assistant."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-
-            meal_plan_data = json.loads(response.choices[0].message.content)
-            
-            # Create the meal plan
-            start_date = datetime.now().date()
-            end_date = start_date + timedelta(days=days-1)
-            
-            meal_plan = MealPlan.objects.create(
-                user=request.user,
-                start_date=start_date,
-                end_date=end_date,
-                total_cost=0  # Will be calculated based on ingredients
-            )
-
-            # Process each meal and create recipes
-            for meal in meal_plan_data['meals']:
-                recipe_data = meal['recipe']
-                
-                # Create or get ingredients
-                ingredients = []
-                for ing_data in recipe_data['ingredients']:
-                    ingredient, _ = Ingredient.objects.get_or_create(
-                        name=ing_data['name'],
-                        defaults={
-                            'cost_per_unit': 0,  # You'll need to implement price lookup
-                            'unit': ing_data['unit'],
-                            'category': 'other'
-                        }
-                    )
-                    ingredients.append(ingredient)
-
-                # Create recipe
-                recipe = Recipe.objects.create(
-                    name=recipe_data['name'],
-                    description=recipe_data['description'],
-                    instructions=recipe_data['instructions'],
-                    prep_time=30,  # Default values, can be adjusted
-                    cook_time=30,
-                    servings=4
+                pantry_items = UserPantry.objects.filter(user=request.user).select_related('ingredient')
+
+            # Validated meals salvaged from the reply(s); missing slots are re-requested
+            parallel = str(request.data.get('parallel', settings.LLM_PARALLEL_GENERATION)).lower() in ('true', '1')
+            meals, missing = generate_meals(days, meals_per_day, user_preferences, pantry_items, parallel)
+            if not meals:
+                return Response(
+                    {"error": "The model did not return a usable meal plan"},
+                    status=status.HTTP_502_BAD_GATEWAY
                 )
 
-                # Add ingredients to recipe
-                for ing_data, ingredient in zip(recipe_data['ingredients'], ingredients):
-                    RecipeIngredient.objects.create(
-                        recipe=recipe,
-                        ingredient=ingredient,
-                        quantity=ing_data['quantity'],
-                        unit=ing_data['unit']
-                    )
+            meal_plan = persist_meal_plan(request.user, days, meals)
 
-                # Add recipe to meal plan
-                MealPlanRecipe.objects.create(
-                    meal_plan=meal_plan,
-                    recipe=recipe,
-                    day=meal['day'],
-                    meal_type=meal['meal_type']
-                )
-
-            return Response(MealPlanSerializer(meal_plan).data, status=status.HTTP_201_CREATED)
+            if request.query_params.get('shape') == 'normalized':
+                prefetch_related_objects([meal_plan], NORMALIZED_PLAN_PREFETCH)
+                data = _normalized_plan(meal_plan)
+            else:
+                data = MealPlanSerializer(meal_plan).data
+            if missing:
+                data['missing_meals'] = [{'day': day, 'meal_type': meal_type} for day, meal_type in missing]
+            return Response(data, status=status.HTTP_201_CREATED)
 
         except Exception as e:
             return Response(
@@ -444,37 +550,92 @@ class MealPlanViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=True, methods=['post'])
+    def swap(self, request, pk=None):
+        """Replace the recipe in one slot of the plan.
+
+        The slot is given by `slot` (a meal plan recipe id) or by `day` and
+        `meal_type`. Without `recipe_id` the best precomputed alternative
+        is used. Only the cost difference of the swapped slot is applied;
+        the plan is not recomputed.
+        """
+        meal_plan = self.get_object()
+        slots = MealPlanRecipe.objects.filter(meal_plan=meal_plan)
+        try:
+            if request.data.get('slot') is not None:
+                slot = slots.get(pk=int(request.data['slot']))
+            else:
+                slot = slots.get(day=int(request.data.get('day')), meal_type=request.data.get('meal_type'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Pass slot, or day and meal_type'}, status=status.HTTP_400_BAD_REQUEST)
+        except MealPlanRecipe.DoesNotExist:
+            return Response({'error': 'Meal slot not found'}, status=status.HTTP_404_NOT_FOUND)
+        except MealPlanRecipe.MultipleObjectsReturned:
+            return Response({'error': 'Several slots match; pass slot'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            new_recipe_id = request.data.get('recipe_id')
+            # recipe_costs is keyed by int ids, so "12" must not slip through as a string
+            new_recipe_id = int(new_recipe_id) if new_recipe_id is not None else None
+        except (TypeError, ValueError):
+            return Response({'error': 'recipe_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if new_recipe_id is None:
+            other_recipes = list(slots.exclude(pk=slot.pk).values_list('recipe_id', flat=True))
+            plan_ingredients = set(RecipeIngredient.objects.filter(
+                recipe_id__in=other_recipes
+            ).values_list('ingredient_id', flat=True))
+            candidates = ranked_alternatives(slot.recipe_id, plan_ingredients, other_recipes, limit=1)
+            if not candidates:
+                return Response({'error': 'No alternatives available for this meal'}, status=status.HTTP_404_NOT_FOUND)
+            new_recipe_id = candidates[0][0]
+        elif not Recipe.objects.filter(pk=new_recipe_id).exists():
+            return Response({'error': 'Recipe not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        with transaction.atomic():
+            costs = recipe_costs([slot.recipe_id, new_recipe_id])
+            cost_delta = costs[new_recipe_id] - costs[slot.recipe_id]
+            # A queryset update skips the slot's post_save recompute of the
+            # whole plan, which would repeat the delta applied below
+            slots.filter(pk=slot.pk).update(recipe_id=new_recipe_id, cooked_at=None)
+            sync.record_change(meal_plan.user_id, 'meal_plan_recipe', slot.pk)
+            meal_plan.total_cost += cost_delta
+            meal_plan.save(update_fields=['total_cost', 'updated_at'])
+
+        meal_plan = MealPlan.objects.prefetch_related(
+            'mealplanrecipe_set__recipe__recipeingredient_set__ingredient'
+        ).get(pk=meal_plan.pk)
+        return Response(MealPlanSerializer(meal_plan).data)
+
+    @action(detail=True, methods=['post'])
+    def cook(self, request, pk=None):
+        """Mark a slot, a day or the whole plan as cooked and update the pantry.
+
+        Pass `slot` (a meal plan recipe id), or `day` and optionally
+        `meal_type`; with none of them every uncooked slot is cooked.
+        """
+        meal_plan = self.get_object()
+        try:
+            slot_id = request.data.get('slot')
+            day = request.data.get('day')
+            result = cook_meal_plan_slots(
+                request.user,
+                meal_plan,
+                slot_id=int(slot_id) if slot_id is not None else None,
+                day=int(day) if day is not None else None,
+                meal_type=request.data.get('meal_type')
+            )
+        except (TypeError, ValueError):
+            return Response({'error': 'slot and day must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
     @action(detail=True, methods=['get'])
     def shopping_list(self, request, pk=None):
         meal_plan = self.get_object()
-        recipes = meal_plan.recipes.all()
-        
-        # Calculate total ingredients needed
-        shopping_list = {}
-        for recipe in recipes:
-            for recipe_ingredient in recipe.recipeingredient_set.all():
-                ingredient = recipe_ingredient.ingredient
-                key = f"{ingredient.name}_{ingredient.unit}"
-                if key not in shopping_list:
-                    shopping_list[key] = {
-                        'ingredient': ingredient.name,
-                        'unit': ingredient.unit,
-                        'total_quantity': 0,
-                        'cost_per_unit': ingredient.cost_per_unit
-                    }
-                shopping_list[key]['total_quantity'] += float(recipe_ingredient.quantity)
-        
-        # Subtract pantry items
-        pantry_items = UserPantry.objects.filter(user=request.user)
-        for item in pantry_items:
-            key = f"{item.ingredient.name}_{item.ingredient.unit}"
-            if key in shopping_list:
-                shopping_list[key]['total_quantity'] = max(
-                    0,
-                    shopping_list[key]['total_quantity'] - float(item.quantity)
-                )
-        
-        return Response(list(shopping_list.values()))
+        # Summed in one aggregate query, less what's already in the pantry
+        return Response([
+            {key: row[key] for key in ('ingredient', 'unit', 'total_quantity', 'cost_per_unit')}
+            for row in shopping_lists(request.user, [meal_plan.pk])
+        ])
 
 class UserPantryViewSet(viewsets.ModelViewSet):
     queryset = UserPantry.objects.all()
@@ -486,23 +647,75 @@ class UserPantryViewSet(viewsets.ModelViewSet):
         return UserPantrySerializer
 
     def get_queryset(self):
-        return UserPantry.objects.filter(user=self.request.user)
+        queryset = UserPantry.objects.filter(user=self.request.user)
+        if self.action in ('list', 'retrieve') and is_requested(request_field_spec(self.request), 'ingredient'):
+            queryset = queryset.select_related('ingredient')
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
     @action(detail=False, methods=['get'])
     def expiring_soon(self, request):
-        """Get pantry items that are expiring soon (within 7 days)"""
-        from datetime import datetime, timedelta
-        from django.db.models import Q
-        
-        # Get items expiring in the next 7 days
-        expiry_date = datetime.now().date() + timedelta(days=7)
-        items = self.get_queryset().filter(
-            Q(expiry_date__lte=expiry_date) & 
-            Q(expiry_date__gte=datetime.now().date())
-        )
-        
+        """Get pantry items that are expiring soon (within `days`, default PANTRY_EXPIRY_WINDOW_DAYS)"""
+        try:
+            days = int(request.query_params.get('days', settings.PANTRY_EXPIRY_WINDOW_DAYS))
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Served from the digest built by scan_expiring_pantry when it's still
+        # fresh; digests hold every field, so ?fields= requests skip them
+        if request_field_spec(request) is None:
+            items = cached_expiring_items(request.user, days)
+            if items is not None:
+                return Response(items)
+
+        items = expiring_queryset(self.get_queryset(), days).select_related('ingredient').order_by('expiry_date')
         serializer = self.get_serializer(items, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['post', 'put', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        """Add, upsert or delete many pantry items in one transaction.
+
+        POST adds quantities to existing rows for the same ingredient,
+        PUT overwrites them, and DELETE removes the rows listed in `ids`.
+        """
+        if request.method == 'DELETE':
+            ids = request.data.get('ids', []) if isinstance(request.data, dict) else request.data
+            if not isinstance(ids, list) or len(ids) > MAX_BULK_ITEMS:
+                return Response(
+                    {'error': f'ids must be a list of at most {MAX_BULK_ITEMS} pantry item ids'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            serializer = UserPantryBulkDeleteSerializer(data={'ids': ids})
+            serializer.is_valid(raise_exception=True)
+            deleted = delete_pantry_items(request.user, serializer.validated_data['ids'])
+            return Response({'deleted': deleted})
+
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('items')
+        if not isinstance(items, list) or len(items) > MAX_BULK_ITEMS:
+            return Response(
+                {'error': f'Expected a list of at most {MAX_BULK_ITEMS} items'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = UserPantryBulkItemSerializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        missing = missing_ingredients(item['ingredient'] for item in serializer.validated_data)
+        if missing:
+            return Response(
+                {'error': 'Unknown ingredients', 'ingredients': missing},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = upsert_pantry_items(
+            request.user,
+            serializer.validated_data,
+            merge=request.method == 'POST'
+        )
+        rows = self.get_queryset().filter(pk__in=[row.pk for row in rows]).select_related('ingredient')
+        return Response(UserPantrySerializer(rows, many=True).data, status=status.HTTP_200_OK)
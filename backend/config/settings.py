@@ -49,11 +49,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'rest_framework.authtoken',
     'corsheaders',
     'api',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.TimingMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -142,16 +145,107 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development
 CORS_ALLOW_CREDENTIALS = True
 
+# Set REDIS_URL (and install the redis package) so every worker shares one
+# cache; without it each process has its own and cross-worker lookups such
+# as token revocation fall back to the short in-process TTLs below
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Token lookups are cached in-process for API_TOKEN_LOCAL_CACHE_TTL seconds
+# and, when a shared cache is configured, there for API_TOKEN_CACHE_TTL seconds
+API_TOKEN_CACHE_TTL = int(os.getenv('API_TOKEN_CACHE_TTL', '300'))
+API_TOKEN_LOCAL_CACHE_TTL = int(os.getenv('API_TOKEN_LOCAL_CACHE_TTL', '10'))
+
+# Basic auth re-hashes the password on every request; set to False to
+# only accept tokens and sessions on the API
+API_PASSWORD_AUTH_ENABLED = os.getenv('API_PASSWORD_AUTH_ENABLED', 'True') == 'True'
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+    ] + (
+        ['rest_framework.authentication.BasicAuthentication'] if API_PASSWORD_AUTH_ENABLED else []
+    ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.instrumentation.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
+
+# LLM settings; prompt token budgets cap how much pantry/preference data is sent
+LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4')
+LLM_PANTRY_TOKEN_BUDGET = int(os.getenv('LLM_PANTRY_TOKEN_BUDGET', '400'))
+LLM_DISLIKED_TOKEN_BUDGET = int(os.getenv('LLM_DISLIKED_TOKEN_BUDGET', '100'))
+# Extra requests for meals missing from a partial or invalid meal plan reply
+LLM_MAX_FOLLOW_UPS = int(os.getenv('LLM_MAX_FOLLOW_UPS', '1'))
+# Generate meal plans with one concurrent request per day (clients can
+# also pass "parallel"); days share a palette of LLM_PALETTE_SIZE ingredients
+LLM_PARALLEL_GENERATION = os.getenv('LLM_PARALLEL_GENERATION', 'False') == 'True'
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+LLM_PALETTE_SIZE = int(os.getenv('LLM_PALETTE_SIZE', '15'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.llm': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+# Pantry items expiring within this many days are reported as expiring soon
+PANTRY_EXPIRY_WINDOW_DAYS = int(os.getenv('PANTRY_EXPIRY_WINDOW_DAYS', '7'))
+
+# Ranked recipes kept per user by refresh_recommendation_feeds
+RECOMMENDATION_FEED_SIZE = int(os.getenv('RECOMMENDATION_FEED_SIZE', '200'))
+
+# Per-request timing spans (db, serialize, render, llm, parse). When disabled
+# the middleware removes itself and the hooks reduce to a contextvar lookup.
+API_TIMING_ENABLED = os.getenv('API_TIMING_ENABLED', 'False') == 'True'
+API_SERVER_TIMING_HEADER = os.getenv('API_SERVER_TIMING_HEADER', 'True') == 'True'
+# /api/metrics/ is served to staff sessions and to scrapers sending
+# "Authorization: Bearer <API_METRICS_TOKEN>". Addresses in
+# API_METRICS_ALLOWED_IPS are trusted by REMOTE_ADDR alone; behind a reverse
+# proxy every request comes from the proxy, so only list them when the app
+# is reached directly.
+API_METRICS_TOKEN = os.getenv('API_METRICS_TOKEN', '')
+API_METRICS_ALLOWED_IPS = [ip for ip in os.getenv('API_METRICS_ALLOWED_IPS', '').split(',') if ip]
+
+# Meal plans that ended more than this many days ago are archived by gc_meal_plans
+MEAL_PLAN_RETENTION_DAYS = int(os.getenv('MEAL_PLAN_RETENTION_DAYS', '180'))
+
+# Compress responses of at least this size; brotli is used when the
+# optional Brotli package is installed, gzip otherwise
+API_COMPRESSION_ENABLED = os.getenv('API_COMPRESSION_ENABLED', 'True') == 'True'
+API_COMPRESSION_MIN_BYTES = int(os.getenv('API_COMPRESSION_MIN_BYTES', '1024'))
+API_GZIP_LEVEL = int(os.getenv('API_GZIP_LEVEL', '6'))
+API_BROTLI_QUALITY = int(os.getenv('API_BROTLI_QUALITY', '5'))
+
+# Admin changelists show PostgreSQL's row estimate above this many rows
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(os.getenv('ADMIN_ESTIMATED_COUNT_THRESHOLD', '100000'))